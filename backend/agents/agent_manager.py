@@ -2,7 +2,19 @@
 Agent Manager - Orchestrates multiple AI agents
 """
 
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Union
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+import time
+import ahocorasick
+from sqlalchemy import create_engine, event
+from langchain_community.utilities import SQLDatabase
+from langchain_community.tools import QuerySQLDatabaseTool
+from .base_agent import AgentStatus, BaseAgent, PRODUCTS_DB_PATH
+from cache import SemanticCache, response_cache
+from .query import Query
+from .catalog import Catalog
 from .categories_agent import CategoriesAgent
 from .products_agent import ProductsAgent
 from .retailers_agent import RetailersAgent
@@ -10,20 +22,120 @@ from logger_service import get_logger
 
 LOGGER = get_logger()
 
+PRODUCTS_DB_URI = f"sqlite:///{PRODUCTS_DB_PATH}"
+
+# Health check tuning; 0 workers means one thread per agent
+HEALTH_CHECK_MAX_WORKERS = int(os.getenv("HEALTH_CHECK_MAX_WORKERS", "0"))
+HEALTH_CHECK_TTL = float(os.getenv("HEALTH_CHECK_TTL", "10"))
+
+RETAILERS_SEMANTIC_CACHE_PATH = ".retailers_semantic_cache.jsonl"
+
+# Simple test query for each agent
+_TEST_QUERIES = {
+    "categories": "what categories do you have",
+    "products": "show me products",
+    "retailers": "show me retailers"
+}
+
+def create_products_database() -> SQLDatabase:
+    """Create a products SQLDatabase; its pool keeps warm connections open between queries"""
+    engine = create_engine(PRODUCTS_DB_URI, connect_args={"check_same_thread": False})
+    
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        # WAL makes NORMAL durable enough, without an fsync per commit
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        # Memory-map the file so reads are served straight from the OS page cache
+        cursor.execute("PRAGMA mmap_size=268435456")
+        cursor.execute("PRAGMA cache_size=-65536")
+        cursor.close()
+    
+    # Schema is reflected once here instead of once per agent
+    return SQLDatabase(engine, sample_rows_in_table_info=0)
+
 class AgentManager:
     """Manages multiple AI agents and routes queries to appropriate agents"""
     
-    def __init__(self):
+    def __init__(self, embeddings: Optional[Any] = None):
+        self._init_routing()
+        self._db = create_products_database()
+        self._sql_tool = QuerySQLDatabaseTool(db=self._db)
+        self.catalog = self._load_catalog()
+        # Extra constructor arguments per agent
+        self._agent_options: Dict[str, Dict[str, Any]] = {"products": {"catalog": self.catalog}}
+        self.retailers_semantic_cache = None
+        if embeddings is not None:
+            self.retailers_semantic_cache = SemanticCache(embeddings, path=RETAILERS_SEMANTIC_CACHE_PATH)
+            self._agent_options["retailers"] = {"semantic_cache": self.retailers_semantic_cache}
+        self._instances: Dict[str, BaseAgent] = {}
+        self._instances_lock = threading.Lock()
+        self._health_cache = None
+        self._health_lock = threading.Lock()
+        LOGGER.info(f"✓ Agent Manager initialized with {len(self.agents)} agents (lazy)")
+    
+    def _init_routing(self) -> None:
+        """Register the agent classes and compile their keywords, the part of routing that needs no DB or LLM"""
+        # Agent classes only - instances (LLM client, DB connection) are created on first use
         self.agents = {
-            "categories": CategoriesAgent(),
-            "products": ProductsAgent(),
-            "retailers": RetailersAgent()
+            "categories": CategoriesAgent,
+            "products": ProductsAgent,
+            "retailers": RetailersAgent
         }
-        LOGGER.info("✓ Agent Manager initialized with all agents")
+        self._agent_names = tuple(self.agents)
+        self.keyword_automaton = self._build_keyword_automaton()
+    
+    @classmethod
+    def keyword_routing_only(cls) -> "AgentManager":
+        """A manager that can pick agents and branches (route_intent) without opening products.db or creating agents"""
+        manager = cls.__new__(cls)
+        manager._init_routing()
+        return manager
     
-    def route_query(self, query: str, context: Optional[Dict] = None) -> Dict[str, Any]:
+    def _load_catalog(self) -> Optional[Catalog]:
+        """Preload the product catalog; agents fall back to SQL if this fails"""
+        try:
+            catalog = Catalog.load(self._db._engine)
+            LOGGER.info(f"✓ Product catalog preloaded ({len(catalog.products)} products)")
+            return catalog
+        except Exception as e:
+            LOGGER.warning(f"[Agent Manager] Could not preload product catalog, using SQL instead: {e}")
+            return None
+    
+    def _get_agent(self, agent_name: str) -> BaseAgent:
+        """Return the agent instance for agent_name, creating it on first access"""
+        agent = self._instances.get(agent_name)
+        if agent is None:
+            with self._instances_lock:
+                agent = self._instances.get(agent_name)
+                if agent is None:
+                    agent = self.agents[agent_name](self._sql_tool, **self._agent_options.get(agent_name, {}))
+                    self._instances[agent_name] = agent
+        return agent
+    
+    def refresh_data(self) -> None:
+        """Reload the data the agents read once from products.db and drop answers built from it"""
+        self.catalog = self._load_catalog()
+        self._agent_options["products"]["catalog"] = self.catalog
+        # Agents not created yet will read the new data on first use
+        products_agent = self._instances.get("products")
+        if products_agent is not None:
+            products_agent.catalog = self.catalog
+        categories_agent = self._instances.get("categories")
+        if categories_agent is not None:
+            categories_agent.invalidate_category_rows()
+        
+        response_cache.invalidate()
+        if self.retailers_semantic_cache is not None:
+            self.retailers_semantic_cache.clear()
+        LOGGER.info("[Agent Manager] Agent data refreshed")
+    
+    def route_query(self, query: Union[str, Query], context: Optional[Dict] = None) -> Dict[str, Any]:
         """Route query to the most appropriate agent"""
         try:
+            # Lowercase once; the router and the selected agent share the result
+            query = Query.of(query)
             LOGGER.info(f"[Agent Manager] Routing query: {query}")
             
             # Find the best agent for this query
@@ -40,6 +152,7 @@ class AgentManager:
                 return {
                     "response": "I'm not sure which specialist can help with that. Try asking about products, categories, or retailers specifically.",
                     "source": "agent_manager_fallback",
+                    "status": AgentStatus.OK,
                     "agent": "General",
                     "routing_confidence": "none"
                 }
@@ -49,49 +162,61 @@ class AgentManager:
             return {
                 "response": f"Sorry, I encountered an error while processing your request: {str(e)}",
                 "source": "agent_manager_error",
+                "status": AgentStatus.ERROR,
                 "agent": "Error Handler"
             }
     
-    def _find_best_agent(self, query: str) -> Optional[Any]:
-        """Find the best agent to handle the query"""
-        query_lower = query.lower()
+    def _build_keyword_automaton(self) -> ahocorasick.Automaton:
+        """Compile every agent keyword into a single Aho-Corasick automaton"""
+        automaton = ahocorasick.Automaton()
         
-        # Agent priority scoring
-        agent_scores = {}
+        # Each keyword maps to (keyword id, agent index, weight) so scoring is plain list indexing
+        keyword_id = 0
+        for agent_index, agent_class in enumerate(self.agents.values()):
+            for keyword in agent_class.get_keywords():
+                # Longer keywords get higher scores
+                automaton.add_word(keyword, (keyword_id, agent_index, len(keyword.split())))
+                keyword_id += 1
         
-        for agent_name, agent in self.agents.items():
-            score = 0
-            keywords = agent.get_keywords()
-            
-            # Count keyword matches
-            for keyword in keywords:
-                if keyword in query_lower:
-                    # Longer keywords get higher scores
-                    score += len(keyword.split())
-            
-            agent_scores[agent_name] = score
-            LOGGER.debug(f"[Agent Manager] {agent_name} score: {score}")
+        automaton.make_automaton()
+        return automaton
+    
+    def _find_best_agent(self, query: Query) -> Optional[BaseAgent]:
+        """Find the best agent to handle the query"""
+        agent_name = self._find_best_agent_name(query)
+        return self._get_agent(agent_name) if agent_name is not None else None
+    
+    def _find_best_agent_name(self, query: Query) -> Optional[str]:
+        """Name the best agent for the query by keyword score, without creating it"""
+        # Agent priority scoring - a single pass over the query finds every keyword,
+        # each distinct keyword counts once no matter how often it appears
+        matches = {value for _, value in self.keyword_automaton.iter(query.lower)}
+        agent_scores = [0] * len(self._agent_names)
+        for _, agent_index, weight in matches:
+            agent_scores[agent_index] += weight
         
-        # Find agent with highest score
-        if max(agent_scores.values()) > 0:
-            best_agent_name = max(agent_scores, key=agent_scores.get)
-            return self.agents[best_agent_name]
+        LOGGER.debug(f"[Agent Manager] Agent scores: {dict(zip(self._agent_names, agent_scores))}")
         
-        # Special logic for complex queries
-        if any(word in query_lower for word in ["retailers", "where to buy", "who sells"]):
-            return self.agents["retailers"]
-        elif any(word in query_lower for word in ["categories", "what do you have", "browse"]):
-            return self.agents["categories"]
-        elif any(word in query_lower for word in ["products", "show me", "find", "search"]):
-            return self.agents["products"]
+        # Find agent with highest score, ties go to the first registered agent
+        best_index = max(range(len(agent_scores)), key=agent_scores.__getitem__)
+        if agent_scores[best_index] > 0:
+            return self._agent_names[best_index]
         
         return None
     
+    def route_intent(self, query: Union[str, Query]) -> Optional[str]:
+        """The agent and query branch route_query would use, e.g. "retailers:cheapest"; None when no agent matches"""
+        query = Query.of(query)
+        agent_name = self._find_best_agent_name(query)
+        if agent_name is None:
+            return None
+        return f"{agent_name}:{self.agents[agent_name].dispatch_branch(query)}"
+    
     def get_all_agents_info(self) -> Dict[str, Any]:
         """Get information about all available agents"""
         agents_info = {}
-        for agent_name, agent in self.agents.items():
-            agents_info[agent_name] = agent.get_agent_info()
+        for agent_name in self.agents:
+            agents_info[agent_name] = self._get_agent(agent_name).agent_info
         
         return {
             "total_agents": len(self.agents),
@@ -100,33 +225,48 @@ class AgentManager:
         }
     
     def health_check(self) -> Dict[str, Any]:
-        """Check health of all agents"""
+        """Check health of all agents, reusing the last result for a short TTL"""
+        with self._health_lock:
+            if self._health_cache is not None:
+                checked_at, cached_health = self._health_cache
+                if time.monotonic() - checked_at < HEALTH_CHECK_TTL:
+                    return cached_health
+            
+            health = self._run_health_check()
+            self._health_cache = (time.monotonic(), health)
+            return health
+    
+    def _run_health_check(self) -> Dict[str, Any]:
+        """Run a test query against every agent concurrently"""
         health_status = {}
+        agents = {agent_name: self._get_agent(agent_name) for agent_name in self.agents}
         
-        for agent_name, agent in self.agents.items():
-            try:
-                # Simple test query for each agent
-                test_queries = {
-                    "categories": "what categories do you have",
-                    "products": "show me products",
-                    "retailers": "show me retailers"
-                }
-                
-                test_query = test_queries.get(agent_name, "test")
-                result = agent.process_query(test_query)
-                
-                health_status[agent_name] = {
-                    "status": "healthy" if "error" not in result.get("source", "") else "unhealthy",
-                    "last_test": "passed" if result.get("response") else "failed",
-                    "agent_info": agent.get_agent_info()
-                }
-                
-            except Exception as e:
-                health_status[agent_name] = {
-                    "status": "error",
-                    "error": str(e),
-                    "agent_info": agent.get_agent_info()
-                }
+        # Each test is an LLM round-trip, so run them side by side; the answer caches are
+        # bypassed, as a cached reply says nothing about whether the model is reachable
+        max_workers = HEALTH_CHECK_MAX_WORKERS or len(agents)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                agent_name: executor.submit(agent.process_query, _TEST_QUERIES.get(agent_name, "test"), {"use_cache": False})
+                for agent_name, agent in agents.items()
+            }
+            
+            for agent_name, future in futures.items():
+                agent = agents[agent_name]
+                try:
+                    result = future.result()
+                    
+                    health_status[agent_name] = {
+                        "status": "healthy" if result.get("status") == AgentStatus.OK else "unhealthy",
+                        "last_test": "passed" if result.get("response") else "failed",
+                        "agent_info": agent.agent_info
+                    }
+                    
+                except Exception as e:
+                    health_status[agent_name] = {
+                        "status": "error",
+                        "error": str(e),
+                        "agent_info": agent.agent_info
+                    }
         
         overall_health = "healthy" if all(
             status["status"] == "healthy" 
@@ -136,5 +276,5 @@ class AgentManager:
         return {
             "overall_health": overall_health,
             "agents": health_status,
-            "timestamp": "now"  # You could use datetime here
-        }
\ No newline at end of file
+            "timestamp": time.time_ns()
+        }
@@ -3,10 +3,19 @@ Base Agent Class for AI Agents
 """
 
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List, Optional
+from enum import Enum
+from functools import cached_property
+from types import MappingProxyType
+from typing import Dict, Any, Callable, List, Mapping, Optional, Tuple, Union
 from logger_service import get_logger
+from cache import response_cache
+from .query import Query
 import os
+import sqlite3
+import threading
 from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlalchemy.sql.elements import TextClause
 from langchain_nvidia_ai_endpoints import ChatNVIDIA
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
@@ -14,9 +23,37 @@ from langchain_core.output_parsers import StrOutputParser
 load_dotenv()
 LOGGER = get_logger()
 
+PRODUCTS_DB_PATH = "products.db"
+# Same endpoint override as the chatbot; unset uses the NVIDIA API
+LLM_BASE_URL = os.getenv("LLM_BASE_URL") or None
+
+class AgentStatus(str, Enum):
+    """Outcome reported in the "status" field of every process_query result"""
+    OK = "ok"
+    ERROR = "error"
+
+# One raw sqlite3 connection per thread for the simple read-only hot path queries
+_raw_connections = threading.local()
+
+def _get_raw_connection() -> sqlite3.Connection:
+    """Return this thread's products.db connection, opening and tuning it on first use"""
+    connection = getattr(_raw_connections, "connection", None)
+    if connection is None:
+        # Read-only: the agents never write, and readers never block behind WAL writers
+        connection = sqlite3.connect(f"file:{PRODUCTS_DB_PATH}?mode=ro", uri=True)
+        connection.execute("PRAGMA query_only=1")
+        connection.execute("PRAGMA mmap_size=268435456")
+        connection.execute("PRAGMA temp_store=MEMORY")
+        connection.execute("PRAGMA cache_size=-20000")
+        _raw_connections.connection = connection
+    return connection
+
 class BaseAgent(ABC):
     """Base class for all AI agents"""
     
+    # Keywords this agent specializes in, defined once per agent class
+    KEYWORDS: Tuple[str, ...] = ()
+    
     def __init__(self, agent_name: str, specialization: str):
         self.agent_name = agent_name
         self.specialization = specialization
@@ -35,6 +72,7 @@ class BaseAgent(ABC):
         return ChatNVIDIA(
             model="mistralai/mixtral-8x22b-instruct-v0.1",
             nvidia_api_key=nvidia_api_key,
+            base_url=LLM_BASE_URL,
             temperature=0.3,  # Lower temperature for more focused responses
             max_tokens=1024
         )
@@ -53,28 +91,78 @@ class BaseAgent(ABC):
         """Create the agent's processing chain"""
         return self.prompt_template | self.llm | StrOutputParser()
     
+    @cached_property
+    def _uncached_chain(self):
+        """The processing chain with the persistent LLM cache disabled, for calls that must reach the model"""
+        return self.prompt_template | self.llm.model_copy(update={"cache": False}) | StrOutputParser()
+    
+    def _fetch_rows(self, sql_query: Union[str, TextClause], params: Optional[Dict[str, Any]] = None) -> List[Tuple]:
+        """Execute a SQL query on the shared engine and return the rows as tuples"""
+        if isinstance(sql_query, str):
+            sql_query = text(sql_query)
+        with self.db._engine.connect() as connection:
+            return [tuple(row) for row in connection.execute(sql_query, params or {})]
+    
+    def _raw_rows(self, sql_query: str, params: Union[Tuple, Mapping[str, Any]] = ()) -> List[Tuple]:
+        """Run a simple read-only query on a raw sqlite3 connection, bypassing LangChain"""
+        return _get_raw_connection().execute(sql_query, params).fetchall()
+    
+    @staticmethod
+    def _tabulate(columns: Tuple[str, ...], rows: List[Tuple]) -> str:
+        """Render rows as tab-separated lines under a fixed header, a compact prompt context for the LLM"""
+        lines = ["\t".join(columns)]
+        lines.extend("\t".join(map(str, row)) for row in rows)
+        return "\n".join(lines)
+    
+    def _generate_response(self, query: Query, db_results: str, formatter: Callable[[str], str],
+                           use_cache: bool = True) -> str:
+        """Generate and format the AI response, reusing cached answers for identical inputs unless use_cache is False"""
+        if not use_cache:
+            # Health checks must prove the model answers, so neither cache may serve them
+            return formatter(self._uncached_chain.invoke({
+                "query": query.raw,
+                "db_results": db_results
+            }))
+        
+        cache_key = response_cache.make_key(self.agent_name, query.lower, db_results)
+        cached_response = response_cache.get(cache_key)
+        if cached_response is not None:
+            LOGGER.info(f"[{self.agent_name} Agent] Response cache hit")
+            return cached_response
+        
+        response = self.chain.invoke({
+            "query": query.raw,
+            "db_results": db_results
+        })
+        
+        formatted_response = formatter(response)
+        response_cache.put(cache_key, formatted_response)
+        return formatted_response
+    
     @abstractmethod
-    def process_query(self, query: str, context: Optional[Dict] = None) -> Dict[str, Any]:
+    def process_query(self, query: Union[str, Query], context: Optional[Dict] = None) -> Dict[str, Any]:
         """Process a query and return results"""
         pass
     
-    def can_handle(self, query: str) -> bool:
-        """Check if this agent can handle the given query"""
-        return any(keyword in query.lower() for keyword in self.get_keywords())
-    
-    @abstractmethod
-    def get_keywords(self) -> List[str]:
+    @classmethod
+    def get_keywords(cls) -> Tuple[str, ...]:
         """Return keywords this agent specializes in"""
-        pass
+        return cls.KEYWORDS
+    
+    @classmethod
+    def dispatch_branch(cls, query: Query) -> str:
+        """Name the query branch process_query would take, without creating the agent"""
+        return "default"
     
-    def get_agent_info(self) -> Dict[str, Any]:
-        """Return agent information"""
-        return {
+    @cached_property
+    def agent_info(self) -> Mapping[str, Any]:
+        """Return agent information, built once and read-only afterwards"""
+        return MappingProxyType({
             "name": self.agent_name,
             "specialization": self.specialization,
             "keywords": self.get_keywords(),
-            "capabilities": self.get_capabilities()
-        }
+            "capabilities": tuple(self.get_capabilities())
+        })
     
     @abstractmethod
     def get_capabilities(self) -> List[str]:
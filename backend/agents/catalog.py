@@ -0,0 +1,84 @@
+"""
+Catalog - In-memory snapshot of the products table with per-product price ranges
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+# Every product with its retailer price range; products nobody sells have a count of 0
+_CATALOG_QUERY = text("""
+    SELECT p.name, c.name as category, MIN(r.price) as min_price, MAX(r.price) as max_price, COUNT(r.id) as retailer_count
+    FROM products p
+    JOIN categories c ON p.category_id = c.id
+    LEFT JOIN retailers r ON p.id = r.product_id
+    GROUP BY p.id, p.name, c.name
+    ORDER BY p.id;
+""")
+
+@dataclass(frozen=True, slots=True)
+class Product:
+    """One catalog entry"""
+    name: str
+    category: str
+    min_price: Optional[float]
+    max_price: Optional[float]
+    retailer_count: int
+
+class Catalog:
+    """Products held in memory, with NumPy columns for filtering and price ordering"""
+
+    def __init__(self, products: List[Product]):
+        self.products = products
+        self.by_category: Dict[str, List[int]] = {}
+        for index, product in enumerate(products):
+            self.by_category.setdefault(product.category, []).append(index)
+
+        self.names_lower = np.array([product.name.lower() for product in products], dtype=str)
+        self.price_min = np.array([np.nan if product.min_price is None else product.min_price for product in products], dtype=np.float64)
+        self.price_max = np.array([np.nan if product.max_price is None else product.max_price for product in products], dtype=np.float64)
+        self.retailer_count = np.array([product.retailer_count for product in products], dtype=np.int32)
+
+        # Row shapes match the products agent's SQL statements
+        self._price_rows = [
+            (product.name, product.category, product.min_price, product.max_price, product.retailer_count)
+            for product in products
+        ]
+        self._list_rows = sorted(
+            ((product.name, product.category) for product in products),
+            key=lambda row: (row[1], row[0])
+        )
+
+    @classmethod
+    def load(cls, engine: Engine) -> "Catalog":
+        """Read the whole catalog in one query"""
+        with engine.connect() as connection:
+            rows = connection.execute(_CATALOG_QUERY).fetchall()
+        return cls([Product(*row) for row in rows])
+
+    def name_mask(self, *substrings: str) -> np.ndarray:
+        """Products whose name contains any of the substrings, case-insensitively"""
+        mask = np.zeros(len(self.products), dtype=bool)
+        for substring in substrings:
+            mask |= np.char.find(self.names_lower, substring.lower()) >= 0
+        return mask
+
+    def category_mask(self, category: str) -> np.ndarray:
+        """Products in the given category"""
+        mask = np.zeros(len(self.products), dtype=bool)
+        mask[self.by_category.get(category, [])] = True
+        return mask
+
+    def price_rows(self, mask: Optional[np.ndarray] = None, order_by_price: bool = False, limit: int = 10) -> List[Tuple]:
+        """(name, category, min_price, max_price, retailer_count) rows for products sold by at least one retailer"""
+        sold = self.retailer_count > 0
+        indices = np.flatnonzero(sold if mask is None else sold & mask)
+        if order_by_price:
+            indices = indices[np.argsort(self.price_min[indices], kind="stable")]
+        return [self._price_rows[index] for index in indices[:limit]]
+
+    def list_rows(self) -> List[Tuple]:
+        """(name, category) rows for every product, ordered by category then name"""
+        return self._list_rows
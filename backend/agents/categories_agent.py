@@ -2,19 +2,35 @@
 Categories Agent - Specializes in category-related queries
 """
 
-from typing import Dict, Any, List, Optional
+from functools import cached_property, partial
+from typing import Dict, Any, List, Optional, Tuple, Union
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_community.utilities import SQLDatabase
 from langchain_community.tools import QuerySQLDatabaseTool
-from .base_agent import BaseAgent, LOGGER
+from .base_agent import AgentStatus, BaseAgent, LOGGER
+from .query import Query
+
+# Category icons
+_CATEGORY_ICONS: Dict[str, str] = {
+    'electronics': '💻',
+    'books': '📚',
+    'home goods': '🏠',
+    'clothing': '👕',
+    'sports': '⚽',
+    'toys': '🧸'
+}
 
 class CategoriesAgent(BaseAgent):
     """AI Agent specialized in handling category-related queries"""
     
-    def __init__(self):
-        # Initialize database first, before calling super().__init__()
-        self.db = SQLDatabase.from_uri("sqlite:///products.db")
-        self.sql_tool = QuerySQLDatabaseTool(db=self.db)
+    KEYWORDS = (
+        "categories", "category", "browse", "explore", "types", "kinds",
+        "what do you have", "what's available", "sections", "departments"
+    )
+    
+    def __init__(self, sql_tool: QuerySQLDatabaseTool):
+        # Set up the shared database tool first, before calling super().__init__()
+        self.sql_tool = sql_tool
+        self.db = sql_tool.db
         
         # Now call parent constructor
         super().__init__(
@@ -47,13 +63,6 @@ class CategoriesAgent(BaseAgent):
         Provide a helpful, engaging response about categories. Be enthusiastic about helping users explore different product categories.
         """)
     
-    def get_keywords(self) -> List[str]:
-        """Keywords this agent specializes in"""
-        return [
-            "categories", "category", "browse", "explore", "types", "kinds",
-            "what do you have", "what's available", "sections", "departments"
-        ]
-    
     def get_capabilities(self) -> List[str]:
         """Categories agent capabilities"""
         return [
@@ -64,40 +73,42 @@ class CategoriesAgent(BaseAgent):
             "Category comparisons"
         ]
     
-    def process_query(self, query: str, context: Optional[Dict] = None) -> Dict[str, Any]:
+    @cached_property
+    def _category_rows(self) -> List[Tuple]:
+        """All categories with their product counts, as (name, product_count) rows"""
+        return self._raw_rows("""
+            SELECT c.name, COUNT(p.id) as product_count
+            FROM categories c
+            LEFT JOIN products p ON c.id = p.category_id
+            GROUP BY c.id, c.name
+            ORDER BY c.name;
+        """)
+    
+    def invalidate_category_rows(self) -> None:
+        """Drop the cached category rows so the next query re-reads them, e.g. after a catalog write"""
+        self.__dict__.pop("_category_rows", None)
+    
+    def process_query(self, query: Union[str, Query], context: Optional[Dict] = None) -> Dict[str, Any]:
         """Process category-related queries"""
+        query = Query.of(query)
         try:
             LOGGER.info(f"[Categories Agent] Processing query: {query}")
             
-            # Execute SQL query to get categories
-            if "categories" in query.lower() or "what do you have" in query.lower():
-                sql_query = "SELECT name FROM categories;"
-                db_results = self.sql_tool.run(sql_query)
-                LOGGER.info(f"[Categories Agent] DB Results: {db_results}")
-            else:
-                # For other category queries, get categories with product counts
-                sql_query = """
-                SELECT c.name, COUNT(p.id) as product_count 
-                FROM categories c 
-                LEFT JOIN products p ON c.id = p.category_id 
-                GROUP BY c.id, c.name
-                ORDER BY product_count DESC;
-                """
-                db_results = self.sql_tool.run(sql_query)
-                LOGGER.info(f"[Categories Agent] DB Results with counts: {db_results}")
-            
-            # Generate AI response
-            response = self.chain.invoke({
-                "query": query,
-                "db_results": db_results
-            })
+            # Categories with product counts are read once and reused for every query
+            rows = self._category_rows
+            db_results = self._tabulate(("category", "product_count"), rows)
+            LOGGER.info(f"[Categories Agent] DB Results with counts: {db_results}")
             
-            # Format the response
-            formatted_response = self._format_category_response(db_results, response)
+            # Generate and format AI response
+            formatted_response = self._generate_response(
+                query, db_results, partial(self._format_category_response, rows),
+                use_cache=(context or {}).get("use_cache", True)
+            )
             
             return {
                 "response": formatted_response,
                 "source": "categories_agent",
+                "status": AgentStatus.OK,
                 "agent": self.agent_name,
                 "data": db_results
             }
@@ -107,34 +118,21 @@ class CategoriesAgent(BaseAgent):
             return {
                 "response": f"Sorry, I encountered an error while fetching categories: {str(e)}",
                 "source": "categories_agent_error",
+                "status": AgentStatus.ERROR,
                 "agent": self.agent_name
             }
     
-    def _format_category_response(self, db_results: str, ai_response: str) -> str:
+    def _format_category_response(self, rows: List[Tuple], ai_response: str) -> str:
         """Format category response beautifully"""
         try:
-            import re
-            
-            # Extract categories from SQL result
-            category_pattern = r"'([^']+)'"
-            categories = re.findall(category_pattern, db_results)
+            categories = [row[0] for row in rows]
             
             if not categories:
                 return ai_response
             
-            # Category icons
-            category_icons = {
-                'electronics': '💻',
-                'books': '📚',
-                'home goods': '🏠',
-                'clothing': '👕',
-                'sports': '⚽',
-                'toys': '🧸'
-            }
-            
             formatted_categories = []
             for category in categories:
-                icon = category_icons.get(category.lower(), '📁')
+                icon = _CATEGORY_ICONS.get(category.lower(), '📁')
                 formatted_categories.append(f"{icon} **{category}**")
             
             header = f"🏪 **Available Categories ({len(categories)}):**\n\n"
@@ -0,0 +1,44 @@
+"""
+Formatting - Price, retailer icon and stock status helpers shared by the retailers agent and the chatbot
+"""
+
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Dict
+
+# Retailer name keyword -> icon, first match wins
+RETAILER_ICONS: Dict[str, str] = {
+    'amazon': '📦', 'walmart': '🛒', 'target': '🎯', 'bestbuy': '🔌',
+    'apple': '🍎', 'samsung': '📱', 'mobilworld': '📱', 'mobileworld': '📱',
+    'techstore': '💻', 'gadgethub': '🔧', 'booknook': '📚', 'kitchenplus': '🍳',
+    'audiostore': '🎵', 'bookstore': '📚', 'homestore': '🏠', 'electronics': '⚡',
+    'gadget': '🔧', 'phone': '📞', 'computer': '💻'
+}
+
+# Stock status buckets: <= 0, 1-10, 11-50, > 50. bisect_left keeps each
+# threshold in the lower bucket, matching the old "stock > n" checks
+_STOCK_STATUS_THRESHOLDS = (0, 10, 50)
+_STOCK_STATUS_TEMPLATES = (
+    "🔴 **Out of Stock**",
+    "🟠 **Low Stock** ({stock} available)",
+    "🟡 **Limited Stock** ({stock} available)",
+    "🟢 **In Stock** ({stock} available)"
+)
+
+def fmt_price(price: float) -> str:
+    """Format a price, dropping cents from four-figure prices"""
+    return f"${price:,.0f}" if price >= 1000 else f"${price:.2f}"
+
+@lru_cache(maxsize=256)
+def get_retailer_icon(retailer_name: str) -> str:
+    """Get appropriate icon for retailer; retailer names repeat, so each is resolved once"""
+    retailer_lower = retailer_name.lower()
+    for keyword, icon in RETAILER_ICONS.items():
+        if keyword in retailer_lower:
+            return icon
+    return '🏪'  # Default store icon
+
+def get_stock_status(stock: int) -> str:
+    """Stock status with color coding, from one binary search over the thresholds"""
+    stock = int(stock)
+    return _STOCK_STATUS_TEMPLATES[bisect_left(_STOCK_STATUS_THRESHOLDS, stock)].format(stock=stock)
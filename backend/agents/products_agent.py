@@ -2,19 +2,142 @@
 Products Agent - Specializes in product-related queries
 """
 
-from typing import Dict, Any, List, Optional
+from functools import partial
+from operator import itemgetter
+from typing import Dict, Any, List, Optional, Tuple, Union
+import ahocorasick
+from sqlalchemy import text
+from sqlalchemy.sql.elements import TextClause
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_community.utilities import SQLDatabase
 from langchain_community.tools import QuerySQLDatabaseTool
-from .base_agent import BaseAgent, LOGGER
+from .base_agent import AgentStatus, BaseAgent, LOGGER
+from .catalog import Catalog
+from .query import Query
+
+# Query keyword -> prepared statement and bind parameters, in priority order
+_SQL_DISPATCH = (
+    ("laptop", "by_name", {"name_pattern": "%Laptop%"}),
+    ("smartphone", "by_either_name", {"name_pattern": "%Smartphone%", "alt_name_pattern": "%Phone%"}),
+    ("phone", "by_either_name", {"name_pattern": "%Smartphone%", "alt_name_pattern": "%Phone%"}),
+    ("book", "by_category", {"category": "Books"}),
+    ("electronics", "by_category", {"category": "Electronics"}),
+    ("price", "by_price", {}),
+    ("cost", "by_price", {}),
+    # Simple list when user asks "what products are available"
+    ("available", "list", {}),
+    ("what products", "list", {}),
+    ("list products", "list", {}),
+)
+
+def _build_sql_dispatch_automaton() -> ahocorasick.Automaton:
+    """Compile the dispatch keywords into one Aho-Corasick automaton"""
+    automaton = ahocorasick.Automaton()
+    for priority, (keyword, statement_name, params) in enumerate(_SQL_DISPATCH):
+        automaton.add_word(keyword, (priority, statement_name, params))
+    automaton.make_automaton()
+    return automaton
+
+_SQL_DISPATCH_AUTOMATON = _build_sql_dispatch_automaton()
+
+# Per-product price range query shared by most statements. WHERE and ORDER BY
+# clauses are only ever taken from the closed whitelists below, values are bound.
+_PRICE_RANGE_TEMPLATE = """
+    SELECT p.name, c.name as category, MIN(r.price) as min_price, MAX(r.price) as max_price, COUNT(r.id) as retailer_count
+    FROM products p 
+    JOIN categories c ON p.category_id = c.id 
+    JOIN retailers r ON p.id = r.product_id
+    {where}
+    GROUP BY p.id, p.name, c.name
+    {order_by}
+    LIMIT {limit};
+"""
+
+_PRICE_RANGE_PREDICATES = {
+    "all": "",
+    "name": "WHERE p.name LIKE :name_pattern",
+    "either_name": "WHERE p.name LIKE :name_pattern OR p.name LIKE :alt_name_pattern",
+    "category": "WHERE c.name = :category",
+}
+
+_PRICE_RANGE_ORDERS = {
+    "none": "",
+    "min_price": "ORDER BY MIN(r.price)",
+}
+
+def _price_range_statement(predicate: str = "all", order_by: str = "none", limit: int = 10) -> TextClause:
+    """Build a price range statement from the whitelisted predicate and ordering"""
+    return text(_PRICE_RANGE_TEMPLATE.format(
+        where=_PRICE_RANGE_PREDICATES[predicate],
+        order_by=_PRICE_RANGE_ORDERS[order_by],
+        limit=int(limit)
+    ))
+
+def _fmt_price_range(mn: float, mx: float) -> str:
+    """Format a price or price range, dropping cents from four-figure prices"""
+    spec = ",.0f" if mn >= 1000 else ".2f"
+    if mn == mx:
+        # Same price across all retailers
+        return f"${format(mn, spec)}"
+    return f"${format(mn, spec)} - ${format(mx, spec)}"
+
+# Headers of the table handed to the LLM: the simple list vs every price range statement
+_LIST_COLUMNS = ("product", "category")
+_PRICE_RANGE_COLUMNS = ("product", "category", "min_price", "max_price", "retailer_count")
+
+# Product name keyword -> dummy image id, first match wins
+_PRODUCT_IMAGE_MAP: Tuple[Tuple[str, str], ...] = (
+    ('laptop', '1'), ('smartphone', '2'), ('phone', '2'), ('book', '3'),
+    ('novel', '3'), ('cookbook', '4'), ('coffee', '5'), ('maker', '5'),
+    ('chair', '6'), ('desk', '6')
+)
+_DEFAULT_PRODUCT_IMAGE = "https://picsum.photos/200/200?random=16"
+
+def _lookup_image(name_lower: str) -> str:
+    """Get dummy image for an already lowercased product name"""
+    for keyword, image_id in _PRODUCT_IMAGE_MAP:
+        if keyword in name_lower:
+            return f"https://picsum.photos/200/200?random={image_id}"
+    return _DEFAULT_PRODUCT_IMAGE
+
+# Detailed product card, filled once per row
+_CARD_TEMPLATE = """🛍️ **{name}**
+📂 Category: {category}
+💰 Price Range: {price}
+🏪 Available at: {retailers}
+🖼️ Image: {image}
+
+"""
 
 class ProductsAgent(BaseAgent):
     """AI Agent specialized in handling product-related queries"""
     
-    def __init__(self):
-        # Initialize database first, before calling super().__init__()
-        self.db = SQLDatabase.from_uri("sqlite:///products.db")
-        self.sql_tool = QuerySQLDatabaseTool(db=self.db)
+    KEYWORDS = (
+        "product", "products", "laptop", "smartphone", "phone", "book", "novel",
+        "chair", "coffee", "maker", "show me", "find", "search", "price",
+        "cost", "buy", "purchase", "electronics", "books", "furniture"
+    )
+    
+    # Prepared statements, built once and executed with bound parameters
+    _STATEMENTS = {
+        "by_name": _price_range_statement("name", limit=5),
+        "by_either_name": _price_range_statement("either_name", limit=5),
+        "by_category": _price_range_statement("category", limit=5),
+        "by_price": _price_range_statement(order_by="min_price", limit=10),
+        "list": text("""
+            SELECT p.name, c.name as category
+            FROM products p 
+            JOIN categories c ON p.category_id = c.id 
+            ORDER BY c.name, p.name;
+        """),
+        "default": _price_range_statement(limit=10),
+    }
+    
+    def __init__(self, sql_tool: QuerySQLDatabaseTool, catalog: Optional[Catalog] = None):
+        # Set up the shared database tool first, before calling super().__init__()
+        self.sql_tool = sql_tool
+        self.db = sql_tool.db
+        # Preloaded catalog; without one every statement is run against SQLite
+        self.catalog = catalog
         
         # Now call parent constructor
         super().__init__(
@@ -49,14 +172,6 @@ class ProductsAgent(BaseAgent):
         Be enthusiastic and knowledgeable about the products.
         """)
     
-    def get_keywords(self) -> List[str]:
-        """Keywords this agent specializes in"""
-        return [
-            "product", "products", "laptop", "smartphone", "phone", "book", "novel",
-            "chair", "coffee", "maker", "show me", "find", "search", "price",
-            "cost", "buy", "purchase", "electronics", "books", "furniture"
-        ]
-    
     def get_capabilities(self) -> List[str]:
         """Products agent capabilities"""
         return [
@@ -67,31 +182,33 @@ class ProductsAgent(BaseAgent):
             "Product details and specifications"
         ]
     
-    def process_query(self, query: str, context: Optional[Dict] = None) -> Dict[str, Any]:
+    def process_query(self, query: Union[str, Query], context: Optional[Dict] = None) -> Dict[str, Any]:
         """Process product-related queries"""
+        query = Query.of(query)
         try:
             LOGGER.info(f"[Products Agent] Processing query: {query}")
             
-            # Determine SQL query based on user request
-            sql_query = self._generate_sql_query(query)
-            LOGGER.info(f"[Products Agent] Generated SQL: {sql_query}")
+            # Determine SQL statement based on user request
+            statement_name, params = self._generate_sql_query(query)
+            LOGGER.info(f"[Products Agent] Selected SQL statement: {statement_name} {params}")
             
-            # Execute SQL query
-            db_results = self.sql_tool.run(sql_query)
+            # Fetch rows, keeping native rows for formatting and a compact table for the LLM
+            rows = self._select_rows(statement_name, params)
+            db_results = self._tabulate(
+                _LIST_COLUMNS if statement_name == "list" else _PRICE_RANGE_COLUMNS, rows
+            )
             LOGGER.info(f"[Products Agent] DB Results: {db_results[:200]}...")
             
-            # Generate AI response
-            response = self.chain.invoke({
-                "query": query,
-                "db_results": db_results
-            })
-            
-            # Format the response
-            formatted_response = self._format_product_response(db_results, response)
+            # Generate and format AI response
+            formatted_response = self._generate_response(
+                query, db_results, partial(self._format_product_response, rows),
+                use_cache=(context or {}).get("use_cache", True)
+            )
             
             return {
                 "response": formatted_response,
                 "source": "products_agent",
+                "status": AgentStatus.OK,
                 "agent": self.agent_name,
                 "data": db_results
             }
@@ -101,97 +218,58 @@ class ProductsAgent(BaseAgent):
             return {
                 "response": f"Sorry, I encountered an error while searching for products: {str(e)}",
                 "source": "products_agent_error",
+                "status": AgentStatus.ERROR,
                 "agent": self.agent_name
             }
     
-    def _generate_sql_query(self, query: str) -> str:
-        """Generate appropriate SQL query based on user query"""
-        query_lower = query.lower()
-        
-        if "laptop" in query_lower:
-            return """
-            SELECT p.name, c.name as category, MIN(r.price) as min_price, MAX(r.price) as max_price, COUNT(r.id) as retailer_count
-            FROM products p 
-            JOIN categories c ON p.category_id = c.id 
-            JOIN retailers r ON p.id = r.product_id
-            WHERE p.name LIKE '%Laptop%' 
-            GROUP BY p.id, p.name, c.name
-            LIMIT 5;
-            """
-        elif "smartphone" in query_lower or "phone" in query_lower:
-            return """
-            SELECT p.name, c.name as category, MIN(r.price) as min_price, MAX(r.price) as max_price, COUNT(r.id) as retailer_count
-            FROM products p 
-            JOIN categories c ON p.category_id = c.id 
-            JOIN retailers r ON p.id = r.product_id
-            WHERE p.name LIKE '%Smartphone%' OR p.name LIKE '%Phone%'
-            GROUP BY p.id, p.name, c.name
-            LIMIT 5;
-            """
-        elif "book" in query_lower:
-            return """
-            SELECT p.name, c.name as category, MIN(r.price) as min_price, MAX(r.price) as max_price, COUNT(r.id) as retailer_count
-            FROM products p 
-            JOIN categories c ON p.category_id = c.id 
-            JOIN retailers r ON p.id = r.product_id
-            WHERE c.name = 'Books' 
-            GROUP BY p.id, p.name, c.name
-            LIMIT 5;
-            """
-        elif "electronics" in query_lower:
-            return """
-            SELECT p.name, c.name as category, MIN(r.price) as min_price, MAX(r.price) as max_price, COUNT(r.id) as retailer_count
-            FROM products p 
-            JOIN categories c ON p.category_id = c.id 
-            JOIN retailers r ON p.id = r.product_id
-            WHERE c.name = 'Electronics' 
-            GROUP BY p.id, p.name, c.name
-            LIMIT 5;
-            """
-        elif "price" in query_lower or "cost" in query_lower:
-            return """
-            SELECT p.name, c.name as category, MIN(r.price) as min_price, MAX(r.price) as max_price, COUNT(r.id) as retailer_count
-            FROM products p 
-            JOIN categories c ON p.category_id = c.id 
-            JOIN retailers r ON p.id = r.product_id
-            GROUP BY p.id, p.name, c.name
-            ORDER BY MIN(r.price) 
-            LIMIT 10;
-            """
-        elif "available" in query_lower or "what products" in query_lower or "list products" in query_lower:
-            # Simple list when user asks "what products are available"
-            return """
-            SELECT p.name, c.name as category
-            FROM products p 
-            JOIN categories c ON p.category_id = c.id 
-            ORDER BY c.name, p.name;
-            """
-        else:
+    @classmethod
+    def dispatch_branch(cls, query: Query) -> str:
+        """Name the SQL statement process_query would run, without creating the agent"""
+        return cls._generate_sql_query(query)[0]
+    
+    @staticmethod
+    def _generate_sql_query(query: Query) -> Tuple[str, Dict[str, Any]]:
+        """Pick the prepared statement and bind parameters for the user query"""
+        # One pass over the query finds every dispatch keyword; the highest-priority hit wins
+        matches = [value for _, value in _SQL_DISPATCH_AUTOMATON.iter(query.lower)]
+        if not matches:
             # Default: show all products with price ranges for specific searches
-            return """
-            SELECT p.name, c.name as category, MIN(r.price) as min_price, MAX(r.price) as max_price, COUNT(r.id) as retailer_count
-            FROM products p 
-            JOIN categories c ON p.category_id = c.id 
-            JOIN retailers r ON p.id = r.product_id
-            GROUP BY p.id, p.name, c.name
-            LIMIT 10;
-            """
+            return "default", {}
+        
+        _, statement_name, params = min(matches, key=itemgetter(0))
+        return statement_name, params
+    
+    def _select_rows(self, statement_name: str, params: Dict[str, Any]) -> List[Tuple]:
+        """Serve the statement from the in-memory catalog, falling back to SQL when it is not loaded"""
+        catalog = self.catalog
+        if catalog is None:
+            return self._fetch_rows(self._STATEMENTS[statement_name], params)
+        
+        if statement_name == "list":
+            return catalog.list_rows()
+        if statement_name == "by_price":
+            return catalog.price_rows(order_by_price=True, limit=10)
+        if statement_name == "by_category":
+            return catalog.price_rows(catalog.category_mask(params["category"]), limit=5)
+        if statement_name in ("by_name", "by_either_name"):
+            # LIKE '%Laptop%' patterns become case-insensitive substring matches
+            substrings = [params[key].strip("%") for key in ("name_pattern", "alt_name_pattern") if key in params]
+            return catalog.price_rows(catalog.name_mask(*substrings), limit=5)
+        return catalog.price_rows(limit=10)
     
-    def _format_product_response(self, db_results: str, ai_response: str) -> str:
+    def _format_product_response(self, rows: List[Tuple], ai_response: str) -> str:
         """Format product response beautifully"""
         try:
-            import re
+            if not rows:
+                return ai_response
             
             # Check if this is a simple list query (name, category only)
-            simple_pattern = r"\('([^']+)',\s*'([^']+)'\)"
-            simple_matches = re.findall(simple_pattern, db_results)
-            
-            if simple_matches:
+            if len(rows[0]) == 2:
                 # Simple product list format
                 formatted_products = []
                 current_category = ""
                 
-                for name, category in simple_matches:
+                for name, category in rows:
                     if category != current_category:
                         if current_category:
                             formatted_products.append("")  # Empty line between categories
@@ -202,71 +280,23 @@ class ProductsAgent(BaseAgent):
                 products_list = "\n".join(formatted_products)
                 return f"🛍️ **Available Products:**\n\n{products_list}\n\n💡 *Ask about specific products for pricing and retailer info!*"
             
-            # Extract products from detailed tuple format (name, category, min_price, max_price, retailer_count)
-            pattern = r"\('([^']+)',\s*'([^']+)',\s*([0-9.]+),\s*([0-9.]+),\s*([0-9]+)\)"
-            matches = re.findall(pattern, db_results)
-            
-            if not matches:
-                return ai_response
-            
-            formatted_products = []
-            for name, category, min_price, max_price, retailer_count in matches:
-                # Get dummy image
-                image_url = self._get_product_image(name, category)
-                
-                # Format price range
-                min_price_float = float(min_price)
-                max_price_float = float(max_price)
-                
-                if min_price_float == max_price_float:
-                    # Same price across all retailers
-                    if min_price_float >= 1000:
-                        price_formatted = f"${min_price_float:,.0f}"
-                    else:
-                        price_formatted = f"${min_price_float:.2f}"
-                else:
-                    # Price range
-                    if min_price_float >= 1000:
-                        price_formatted = f"${min_price_float:,.0f} - ${max_price_float:,.0f}"
-                    else:
-                        price_formatted = f"${min_price_float:.2f} - ${max_price_float:.2f}"
-                
-                # Retailer count info
-                retailer_info = f"{retailer_count} retailer{'s' if int(retailer_count) != 1 else ''}"
-                
-                product_card = f"""🛍️ **{name}**
-📂 Category: {category}
-💰 Price Range: {price_formatted}
-🏪 Available at: {retailer_info}
-🖼️ Image: {image_url}
-
-"""
-                formatted_products.append(product_card)
-            
-            header = f"🔍 **Found {len(matches)} product{'s' if len(matches) != 1 else ''}:**\n\n"
-            products_list = "".join(formatted_products)
+            # Detailed rows: (name, category, min_price, max_price, retailer_count)
+            # Cards are built in one comprehension, then header, cards and footer are joined once
+            header = f"🔍 **Found {len(rows)} product{'s' if len(rows) != 1 else ''}:**\n\n"
+            cards = [
+                _CARD_TEMPLATE.format(
+                    name=name,
+                    category=category,
+                    price=_fmt_price_range(float(min_price), float(max_price)),
+                    retailers=f"{retailer_count} retailer{'s' if int(retailer_count) != 1 else ''}",
+                    image=_lookup_image(name.lower())
+                )
+                for name, category, min_price, max_price, retailer_count in rows
+            ]
             footer = f"\n{ai_response}\n\n💡 *Ask \"Who sells [product]?\" to see specific retailers and their prices!*"
             
-            return header + products_list + footer
+            return "".join((header, *cards, footer))
             
         except Exception as e:
             LOGGER.warning(f"[Products Agent] Formatting error: {e}")
-            return ai_response
-    
-    def _get_product_image(self, product_name: str, category: str) -> str:
-        """Get dummy image for product"""
-        product_lower = product_name.lower()
-        
-        image_map = {
-            'laptop': '1', 'smartphone': '2', 'phone': '2', 'book': '3',
-            'novel': '3', 'cookbook': '4', 'coffee': '5', 'maker': '5',
-            'chair': '6', 'desk': '6'
-        }
-        
-        image_id = '16'  # default
-        for keyword, img_id in image_map.items():
-            if keyword in product_lower:
-                image_id = img_id
-                break
-        
-        return f"https://picsum.photos/200/200?random={image_id}"
\ No newline at end of file
+            return ai_response
\ No newline at end of file
@@ -0,0 +1,22 @@
+"""
+Query - A user query lowercased once and shared along the routing path
+"""
+
+from dataclasses import dataclass
+from typing import Union
+
+@dataclass(frozen=True, slots=True)
+class Query:
+    """User query text together with its lowercased form"""
+    raw: str
+    lower: str
+
+    @classmethod
+    def of(cls, query: Union[str, "Query"]) -> "Query":
+        """Wrap a raw query string, passing existing Query objects through unchanged"""
+        if isinstance(query, Query):
+            return query
+        return cls(raw=query, lower=query.lower())
+
+    def __str__(self) -> str:
+        return self.raw
@@ -2,19 +2,88 @@
 Retailers Agent - Specializes in retailer-related queries
 """
 
-from typing import Dict, Any, List, Optional
+from functools import partial
+from operator import itemgetter
+from typing import Dict, Any, List, Optional, Tuple, Union
+import ahocorasick
+import numpy as np
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_community.utilities import SQLDatabase
 from langchain_community.tools import QuerySQLDatabaseTool
-from .base_agent import BaseAgent, LOGGER
+from cache import SemanticCache
+from .base_agent import AgentStatus, BaseAgent, LOGGER
+from .formatting import fmt_price, get_retailer_icon, get_stock_status
+from .query import Query
+
+# Retailer card, filled once per row
+_CARD_TEMPLATE = """{icon} **{name}**
+🛍️ Product: {product}
+💰 Price: {price}
+📊 {stock_status}
+📍 Location: {location}
+⭐ Rating: {stars} ({rating}/5.0)
+
+"""
+
+# One parametrised statement serves every branch; a NULL filter matches all rows.
+# Price ordering comes first when requested, otherwise best ratings lead.
+_RETAILER_QUERY = """
+    SELECT r.name, p.name as product, r.price, r.stock, r.location, r.rating
+    FROM retailers r 
+    JOIN products p ON r.product_id = p.id 
+    LEFT JOIN categories c ON p.category_id = c.id
+    WHERE (:name_like IS NULL OR p.name LIKE :name_like OR p.name LIKE :alt_name_like)
+      AND (:category IS NULL OR c.name = :category)
+    ORDER BY CASE WHEN :order_by = 'price' THEN r.price END ASC, r.rating DESC, r.price ASC
+    LIMIT :limit;
+"""
+
+# Header of the table handed to the LLM, identical for every branch
+_RESULT_COLUMNS = ("retailer", "product", "price", "stock", "location", "rating")
+
+def _query_params(**overrides: Any) -> Dict[str, Any]:
+    """Complete a branch's bind parameters with the defaults for unused filters"""
+    params = {"name_like": None, "alt_name_like": None, "category": None, "order_by": "price", "limit": -1}
+    params.update(overrides)
+    return params
+
+# Query keyword -> branch name and bind parameters, in priority order
+_SQL_DISPATCH = (
+    ("smartphone", "by_either_name", _query_params(name_like="%Smartphone%", alt_name_like="%Phone%")),
+    ("phone", "by_either_name", _query_params(name_like="%Smartphone%", alt_name_like="%Phone%")),
+    ("laptop", "by_name", _query_params(name_like="%Laptop%")),
+    ("book", "by_category", _query_params(category="Books")),
+    ("cheapest", "cheapest", _query_params(limit=10)),
+    ("lowest price", "cheapest", _query_params(limit=10)),
+)
+
+# Default: show all retailers with best ratings first
+_DEFAULT_QUERY_PARAMS = _query_params(order_by="rating", limit=10)
+
+def _build_sql_dispatch_automaton() -> ahocorasick.Automaton:
+    """Compile the dispatch keywords into one Aho-Corasick automaton"""
+    automaton = ahocorasick.Automaton()
+    for priority, (keyword, statement_name, params) in enumerate(_SQL_DISPATCH):
+        automaton.add_word(keyword, (priority, statement_name, params))
+    automaton.make_automaton()
+    return automaton
+
+_SQL_DISPATCH_AUTOMATON = _build_sql_dispatch_automaton()
 
 class RetailersAgent(BaseAgent):
     """AI Agent specialized in handling retailer-related queries"""
     
-    def __init__(self):
-        # Initialize database first, before calling super().__init__()
-        self.db = SQLDatabase.from_uri("sqlite:///products.db")
-        self.sql_tool = QuerySQLDatabaseTool(db=self.db)
+    KEYWORDS = (
+        "retailer", "retailers", "store", "stores", "shop", "shops",
+        "where to buy", "who sells", "stock", "availability", "in stock",
+        "store location", "buy from", "purchase from"
+    )
+    
+    def __init__(self, sql_tool: QuerySQLDatabaseTool, semantic_cache: Optional[SemanticCache] = None):
+        # Set up the shared database tool first, before calling super().__init__()
+        self.sql_tool = sql_tool
+        self.db = sql_tool.db
+        # Paraphrased queries answered from earlier results; disabled without embeddings
+        self.semantic_cache = semantic_cache
         
         # Now call parent constructor
         super().__init__(
@@ -49,14 +118,6 @@ class RetailersAgent(BaseAgent):
         Be practical and give actionable advice about shopping and availability.
         """)
     
-    def get_keywords(self) -> List[str]:
-        """Keywords this agent specializes in"""
-        return [
-            "retailer", "retailers", "store", "stores", "shop", "shops",
-            "where to buy", "who sells", "stock", "availability", "in stock",
-            "store location", "buy from", "purchase from"
-        ]
-    
     def get_capabilities(self) -> List[str]:
         """Retailers agent capabilities"""
         return [
@@ -67,145 +128,112 @@ class RetailersAgent(BaseAgent):
             "Purchase recommendations"
         ]
     
-    def process_query(self, query: str, context: Optional[Dict] = None) -> Dict[str, Any]:
+    def process_query(self, query: Union[str, Query], context: Optional[Dict] = None) -> Dict[str, Any]:
         """Process retailer-related queries"""
+        query = Query.of(query)
         try:
-            LOGGER.info(f"[Retailers Agent] Processing query: {query}")
+            LOGGER.info("[Retailers Agent] Processing query: %s", query)
             
-            # Generate SQL query based on user request
-            sql_query = self._generate_sql_query(query)
-            LOGGER.info(f"[Retailers Agent] Generated SQL: {sql_query}")
+            # Determine the query branch and its parameters based on user request
+            statement_name, params = self._generate_sql_query(query)
+            LOGGER.info("[Retailers Agent] Selected SQL branch: %s %s", statement_name, params)
             
-            # Execute SQL query
-            db_results = self.sql_tool.run(sql_query)
-            LOGGER.info(f"[Retailers Agent] DB Results: {db_results}")
+            # A close paraphrase that maps to the same query branch reuses the earlier answer
+            context = context or {}
+            use_cache = context.get("use_cache", True)
+            semantic_cache = self.semantic_cache if use_cache else None
+            if semantic_cache is not None:
+                # The API embeds each message once and passes the vector down in the context
+                query_vector = context.get("query_vector")
+                if query_vector is None:
+                    query_vector = semantic_cache.embed(query.raw)
+                cached_result = semantic_cache.get(query_vector, statement_name)
+                if cached_result is not None:
+                    LOGGER.info("[Retailers Agent] Semantic cache hit")
+                    return cached_result
             
-            # Generate AI response
-            response = self.chain.invoke({
-                "query": query,
-                "db_results": db_results
-            })
+            # Execute SQL query on the cached connection, binding the parameters;
+            # native rows go to the formatter, a compact table to the LLM
+            rows = self._raw_rows(_RETAILER_QUERY, params)
+            db_results = self._tabulate(_RESULT_COLUMNS, rows)
+            LOGGER.info("[Retailers Agent] DB Results: %s", db_results)
             
-            # Format the response
-            formatted_response = self._format_retailer_response(db_results, response)
+            # Generate and format AI response
+            formatted_response = self._generate_response(
+                query, db_results, partial(self._format_retailer_response, rows),
+                use_cache=use_cache
+            )
             
-            return {
+            result = {
                 "response": formatted_response,
                 "source": "retailers_agent",
+                "status": AgentStatus.OK,
                 "agent": self.agent_name,
                 "data": db_results
             }
+            if semantic_cache is not None:
+                semantic_cache.put(query_vector, statement_name, result, question=query.raw)
+            return result
             
         except Exception as e:
-            LOGGER.error(f"[Retailers Agent] Error: {e}")
+            LOGGER.error("[Retailers Agent] Error: %s", e)
             return {
                 "response": f"Sorry, I encountered an error while finding retailers: {str(e)}",
                 "source": "retailers_agent_error",
+                "status": AgentStatus.ERROR,
                 "agent": self.agent_name
             }
     
-    def _generate_sql_query(self, query: str) -> str:
-        """Generate appropriate SQL query based on user query"""
-        query_lower = query.lower()
+    @classmethod
+    def dispatch_branch(cls, query: Query) -> str:
+        """Name the SQL statement process_query would run, without creating the agent"""
+        return cls._generate_sql_query(query)[0]
+    
+    @staticmethod
+    def _generate_sql_query(query: Query) -> Tuple[str, Dict[str, Any]]:
+        """Pick the query branch and bind parameters for the user query"""
+        # One pass over the query finds every dispatch keyword; the highest-priority hit wins
+        matches = [value for _, value in _SQL_DISPATCH_AUTOMATON.iter(query.lower)]
+        if not matches:
+            return "default", _DEFAULT_QUERY_PARAMS
         
-        if "smartphone" in query_lower or "phone" in query_lower:
-            return """
-            SELECT r.name, p.name as product, r.price, r.stock, r.location, r.rating
-            FROM retailers r 
-            JOIN products p ON r.product_id = p.id 
-            WHERE p.name LIKE '%Smartphone%' OR p.name LIKE '%Phone%'
-            ORDER BY r.price ASC;
-            """
-        elif "laptop" in query_lower:
-            return """
-            SELECT r.name, p.name as product, r.price, r.stock, r.location, r.rating
-            FROM retailers r 
-            JOIN products p ON r.product_id = p.id 
-            WHERE p.name LIKE '%Laptop%'
-            ORDER BY r.price ASC;
-            """
-        elif "book" in query_lower:
-            return """
-            SELECT r.name, p.name as product, r.price, r.stock, r.location, r.rating
-            FROM retailers r 
-            JOIN products p ON r.product_id = p.id 
-            JOIN categories c ON p.category_id = c.id
-            WHERE c.name = 'Books'
-            ORDER BY r.price ASC;
-            """
-        elif "cheapest" in query_lower or "lowest price" in query_lower:
-            return """
-            SELECT r.name, p.name as product, r.price, r.stock, r.location, r.rating
-            FROM retailers r 
-            JOIN products p ON r.product_id = p.id 
-            ORDER BY r.price ASC 
-            LIMIT 10;
-            """
-        else:
-            # Default: show all retailers with best ratings first
-            return """
-            SELECT r.name, p.name as product, r.price, r.stock, r.location, r.rating
-            FROM retailers r 
-            JOIN products p ON r.product_id = p.id 
-            ORDER BY r.rating DESC, r.price ASC
-            LIMIT 10;
-            """
+        _, statement_name, params = min(matches, key=itemgetter(0))
+        return statement_name, params
     
-    def _format_retailer_response(self, db_results: str, ai_response: str) -> str:
+    def _format_retailer_response(self, rows: List[Tuple], ai_response: str) -> str:
         """Format retailer response beautifully"""
         try:
-            import re
-            
-            # Extract retailers from new tuple format (name, product, price, stock, location, rating)
-            pattern = r"'([^']+)',\s*'([^']+)',\s*([0-9.]+),\s*([0-9]+),\s*'([^']*)',\s*([0-9.]+)"
-            matches = re.findall(pattern, db_results)
-            
-            if not matches:
+            # Rows are (name, product, price, stock, location, rating)
+            if not rows:
                 return ai_response
             
-            # Retailer icons
-            retailer_icons = {
-                'amazon': '📦', 'walmart': '🛒', 'target': '🎯', 'bestbuy': '🔌', 
-                'mobileworld': '📱', 'techstore': '💻', 'gadgethub': '🔧',
-                'booknook': '📚', 'kitchenplus': '🍳', 'audiostore': '🎵'
-            }
+            # Price column as one array, shared by the cards and the comparison summary
+            prices = np.fromiter((row[2] for row in rows), dtype=np.float64, count=len(rows))
             
-            formatted_retailers = []
-            for retailer_name, product_name, price, stock, location, rating in matches:
-                icon = self._get_retailer_icon(retailer_name, retailer_icons)
-                stock_status = self._get_stock_status(int(stock))
-                
-                # Format price
-                price_float = float(price)
-                if price_float >= 1000:
-                    price_formatted = f"${price_float:,.0f}"
-                else:
-                    price_formatted = f"${price_float:.2f}"
-                
-                # Format rating
-                rating_stars = "⭐" * int(float(rating))
-                rating_display = f"{rating_stars} ({rating}/5.0)"
-                
-                retailer_card = f"""{icon} **{retailer_name}**
-🛍️ Product: {product_name}
-💰 Price: {price_formatted}
-📊 {stock_status}
-📍 Location: {location}
-⭐ Rating: {rating_display}
-
-"""
-                formatted_retailers.append(retailer_card)
+            # Cards are built in one comprehension, then header, cards and footer are joined once
+            cards = [
+                _CARD_TEMPLATE.format(
+                    icon=get_retailer_icon(retailer_name),
+                    name=retailer_name,
+                    product=product_name,
+                    price=fmt_price(price),
+                    stock_status=get_stock_status(stock),
+                    location=location,
+                    stars="⭐" * int(float(rating)),
+                    rating=rating
+                )
+                for (retailer_name, product_name, _, stock, location, rating), price in zip(rows, prices.tolist())
+            ]
             
-            product_name = matches[0][1] if matches else "products"
-            header = f"🏬 **Retailers selling {product_name} ({len(matches)}):**\n\n"
-            retailers_list = "".join(formatted_retailers)
+            product_name = rows[0][1]
+            header = f"🏬 **Retailers selling {product_name} ({len(rows)}):**\n\n"
             
             # Add comparison tips
-            if len(matches) > 1:
-                prices = [float(match[2]) for match in matches]
-                min_price = min(prices)
-                max_price = max(prices)
-                savings = max_price - min_price
+            if len(rows) > 1:
+                # Min, max and spread are C reductions over the price column
+                min_price = float(prices.min())
+                max_price = float(prices.max())
+                savings = float(np.ptp(prices))
                 
                 if savings > 0:
                     footer = f"\n{ai_response}\n\n💡 **Price Comparison:**\n• Cheapest: ${min_price:.2f}\n• Most Expensive: ${max_price:.2f}\n• Potential Savings: ${savings:.2f}"
@@ -214,27 +242,8 @@ class RetailersAgent(BaseAgent):
             else:
                 footer = f"\n{ai_response}\n\n💡 *This is the only retailer currently selling this product.*"
             
-            return header + retailers_list + footer
+            return "".join((header, *cards, footer))
             
         except Exception as e:
-            LOGGER.warning(f"[Retailers Agent] Formatting error: {e}")
-            return ai_response
-    
-    def _get_retailer_icon(self, retailer_name: str, icon_map: Dict[str, str]) -> str:
-        """Get appropriate icon for retailer"""
-        retailer_lower = retailer_name.lower()
-        for keyword, icon in icon_map.items():
-            if keyword in retailer_lower:
-                return icon
-        return '🏪'  # Default store icon
-    
-    def _get_stock_status(self, stock: int) -> str:
-        """Get stock status with color coding"""
-        if stock > 50:
-            return f"🟢 **In Stock** ({stock} available)"
-        elif stock > 10:
-            return f"🟡 **Limited Stock** ({stock} available)"
-        elif stock > 0:
-            return f"🟠 **Low Stock** ({stock} available)"
-        else:
-            return "🔴 **Out of Stock**"
\ No newline at end of file
+            LOGGER.warning("[Retailers Agent] Formatting error: %s", e)
+            return ai_response
\ No newline at end of file
@@ -0,0 +1,203 @@
+"""
+Micro-batching of concurrent LLM and embedding calls
+"""
+
+import asyncio
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from functools import partial
+from typing import Any, Dict, List, Optional, Set, Tuple
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import RunnableLambda
+from cache import CachedEmbeddings
+from logger_service import get_logger
+
+LOGGER = get_logger()
+
+# Calls arriving within the window are sent together, up to the batch size
+LLM_BATCH_WINDOW_MS = float(os.getenv("LLM_BATCH_WINDOW_MS", "10"))
+LLM_MAX_BATCH_SIZE = int(os.getenv("LLM_MAX_BATCH_SIZE", "16"))
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+EMBEDDING_MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "32"))
+# Threads reserved for embedding forward passes, apart from the default executor
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", str(os.cpu_count() or 1)))
+
+# Set by a streaming request; streamable model calls made in its context send their tokens here
+TOKEN_SINK: ContextVar[Optional[asyncio.Queue]] = ContextVar("token_sink", default=None)
+
+class MicroBatcher(ABC):
+    """Queues items submitted by concurrent coroutines and hands them to _dispatch in batches"""
+
+    def __init__(self, window_ms: float, max_batch_size: int):
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._runner_task: Optional[asyncio.Task] = None
+        # The loop only keeps weak references to tasks, so running ones are held here
+        self._tasks: Set[asyncio.Task] = set()
+        # Server event loop that synchronous callers on worker threads submit to
+        self._home_loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Let synchronous calls from worker threads join the batches formed on loop"""
+        self._home_loop = loop
+    
+    def _submit_from_thread(self, item: Any) -> Any:
+        """Queue an item on the bound loop from a worker thread and block until its result"""
+        return asyncio.run_coroutine_threadsafe(self._submit(item), self._home_loop).result()
+    
+    def _can_submit_from_thread(self) -> bool:
+        """Whether the bound loop is running and the caller is not on it, where blocking would deadlock"""
+        loop = self._home_loop
+        if loop is None or not loop.is_running():
+            return False
+        try:
+            return asyncio.get_running_loop() is not loop
+        except RuntimeError:
+            return True
+
+    def _ensure_runner(self) -> asyncio.Queue:
+        """Start the queue and its runner on the current event loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._runner_task is None or self._runner_task.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._runner_task = self._spawn(loop, self._runner())
+        return self._queue
+
+    def _spawn(self, loop: asyncio.AbstractEventLoop, coroutine: Any) -> asyncio.Task:
+        """Start a task on loop, keeping it referenced until it finishes"""
+        task = loop.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _submit(self, item: Any) -> Any:
+        """Queue an item and wait for its result"""
+        future = asyncio.get_running_loop().create_future()
+        self._ensure_runner().put_nowait((item, future))
+        return await future
+
+    async def _runner(self) -> None:
+        """Drain the queue every window, or as soon as a full batch is waiting"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self._spawn(loop, self._dispatch(batch))
+
+    @abstractmethod
+    async def _dispatch(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        """Process one batch and resolve every future in it"""
+        pass
+
+    @staticmethod
+    def _resolve(futures: List[asyncio.Future], results: List[Any]) -> None:
+        """Hand each caller its own result, or raise its exception in the caller"""
+        for future, result in zip(futures, results):
+            # The caller may have been cancelled while the batch was in flight
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+class LLMBatcher(MicroBatcher):
+    """Collects concurrent prompts for one chat model and submits them with a single abatch call"""
+
+    def __init__(self, llm: BaseChatModel, window_ms: float = LLM_BATCH_WINDOW_MS, max_batch_size: int = LLM_MAX_BATCH_SIZE):
+        super().__init__(window_ms, max_batch_size)
+        self.llm = llm
+
+    async def submit(self, prompt: Any, stop: Optional[List[str]] = None) -> Any:
+        """Queue a prompt and wait for its model response"""
+        return await self._submit((prompt, stop))
+
+    def invoke(self, prompt: Any, stop: Optional[List[str]] = None) -> Any:
+        """Synchronous calls bypass the batcher"""
+        return self.llm.invoke(prompt, stop=stop)
+
+    async def submit_streamable(self, prompt: Any, stop: Optional[List[str]] = None) -> Any:
+        """Stream the response into TOKEN_SINK when the caller set one, otherwise batch as usual"""
+        sink = TOKEN_SINK.get()
+        if sink is None:
+            return await self.submit(prompt, stop)
+        
+        # A streamed call is its own request, so it skips the batch
+        message = None
+        async for chunk in self.llm.astream(prompt, stop=stop):
+            if chunk.content:
+                sink.put_nowait(chunk.content)
+            message = chunk if message is None else message + chunk
+        return message
+    
+    def as_runnable(self, stop: Optional[List[str]] = None, streamable: bool = False) -> RunnableLambda:
+        """Drop-in replacement for the model (or model.bind(stop=...)) inside a chain; only streamable steps stream"""
+        submit = self.submit_streamable if streamable else self.submit
+        return RunnableLambda(partial(self.invoke, stop=stop), afunc=partial(submit, stop=stop))
+
+    async def _dispatch(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        """Send one abatch call per distinct stop sequence, since abatch applies one set of call options"""
+        groups: Dict[Optional[Tuple[str, ...]], List[Tuple[Any, asyncio.Future]]] = {}
+        for (prompt, stop), future in batch:
+            groups.setdefault(tuple(stop) if stop else None, []).append((prompt, future))
+
+        await asyncio.gather(*(self._dispatch_group(stop, items) for stop, items in groups.items()))
+
+    async def _dispatch_group(self, stop: Optional[Tuple[str, ...]], items: List[Tuple[Any, asyncio.Future]]) -> None:
+        """Send one stop-sequence group and resolve its futures without waiting on the other groups"""
+        LOGGER.debug(f"[LLM Batcher] Sending batch of {len(items)}")
+        try:
+            responses = await self.llm.abatch(
+                [prompt for prompt, _ in items], stop=list(stop) if stop else None, return_exceptions=True
+            )
+        except Exception as e:
+            responses = [e] * len(items)
+        self._resolve([future for _, future in items], responses)
+
+class EmbeddingBatcher(MicroBatcher, Embeddings):
+    """Embeddings whose async query calls are coalesced into one batched forward pass"""
+
+    def __init__(self, embeddings: CachedEmbeddings, window_ms: float = EMBEDDING_BATCH_WINDOW_MS,
+                 max_batch_size: int = EMBEDDING_MAX_BATCH_SIZE, workers: int = EMBEDDING_WORKERS):
+        super().__init__(window_ms, max_batch_size)
+        self.embeddings = embeddings
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embedding")
+
+    def embed_query(self, text: str) -> List[float]:
+        """Synchronous calls from worker threads (e.g. the agents) join the batches of the bound loop"""
+        if self._can_submit_from_thread():
+            return self._submit_from_thread(text)
+        return self.embeddings.embed_query(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Document batches are already batched"""
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Queue a query and wait for its vector"""
+        return await self._submit(text)
+
+    async def _dispatch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        """Embed the batch on the embedding pool so the forward pass neither blocks the event loop nor waits behind SQLite work"""
+        futures = [future for _, future in batch]
+        try:
+            vectors = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self.embeddings.embed_queries, [text for text, _ in batch]
+            )
+        except Exception as e:
+            vectors = [e] * len(batch)
+        self._resolve(futures, vectors)
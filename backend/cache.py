@@ -0,0 +1,282 @@
+"""
+Caching for LLM calls and formatted agent responses
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Hashable, List, Optional, TextIO, Tuple
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.globals import set_llm_cache
+from langchain_community.cache import SQLiteCache
+from logger_service import get_logger
+
+LOGGER = get_logger()
+
+LLM_CACHE_PATH = ".llm_cache.db"
+EMBEDDING_CACHE_PATH = ".embedding_cache.db"
+
+# Semantic cache tuning: minimum cosine similarity for a hit and entry lifetime in seconds
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+
+def setup_llm_cache(database_path: str = LLM_CACHE_PATH) -> None:
+    """Persist LLM responses so identical prompts skip the NVIDIA API call"""
+    set_llm_cache(SQLiteCache(database_path=database_path))
+    LOGGER.info(f"✓ LLM cache enabled ({database_path})")
+
+class ResponseCache:
+    """Thread-safe LRU cache of formatted agent responses"""
+
+    def __init__(self, maxsize: int = 512):
+        self.maxsize = maxsize
+        self.version = 0
+        self._entries: "OrderedDict[Hashable, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def make_key(self, agent_name: str, query_lower: str, db_results: str) -> Tuple[int, str, str, str]:
+        """Build a cache key from the agent, the lowercased query and the data it was answered from"""
+        db_hash = hashlib.md5(db_results.encode()).hexdigest()
+        return (self.version, agent_name, query_lower.strip(), db_hash)
+
+    def get(self, key: Hashable) -> Optional[str]:
+        """Return the cached response for key, if any"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: str) -> None:
+        """Store a response, evicting the least recently used entry when full"""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        """Drop all cached responses, e.g. after the products database is rewritten"""
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+        LOGGER.info(f"[Response Cache] Invalidated (version {self.version})")
+
+# Shared cache instance used by all agents
+response_cache = ResponseCache()
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that answers repeated query texts from memory or a persistent SHA-256 keyed table"""
+
+    def __init__(self, embeddings: Embeddings, namespace: str = "", database_path: str = EMBEDDING_CACHE_PATH,
+                 memory_size: int = 2048):
+        self.embeddings = embeddings
+        # Namespace (e.g. the model name) keeps vectors from different models apart
+        self.namespace = namespace
+        self._connection = sqlite3.connect(database_path, check_same_thread=False)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS embed_cache (hash BLOB PRIMARY KEY, vec BLOB)")
+        self._lock = threading.Lock()
+        # Hot queries skip the sqlite read too; tuples keep cached vectors immutable
+        self.memory_size = memory_size
+        self._memory: "OrderedDict[str, Tuple[float, ...]]" = OrderedDict()
+
+    def embed_query(self, text: str) -> List[float]:
+        """Return the cached vector for text, embedding and storing it on first sight"""
+        return self.embed_queries([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed several query texts, sending only the unseen ones to the model in one batch"""
+        vectors: Dict[str, Tuple[float, ...]] = {}
+        with self._lock:
+            for text in texts:
+                if text in vectors:
+                    continue
+                vector = self._memory.get(text)
+                if vector is not None:
+                    self._memory.move_to_end(text)
+                else:
+                    row = self._connection.execute("SELECT vec FROM embed_cache WHERE hash = ?", (self._key(text),)).fetchone()
+                    if row is None:
+                        continue
+                    vector = tuple(np.frombuffer(row[0], dtype=np.float32).tolist())
+                    self._remember(text, vector)
+                vectors[text] = vector
+
+        misses = [text for text in dict.fromkeys(texts) if text not in vectors]
+        if misses:
+            if len(misses) == 1:
+                embedded = [self.embeddings.embed_query(misses[0])]
+            else:
+                embedded = self.embeddings.embed_documents(misses)
+            with self._lock:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO embed_cache (hash, vec) VALUES (?, ?)",
+                    [(self._key(text), np.asarray(vector, dtype=np.float32).tobytes()) for text, vector in zip(misses, embedded)]
+                )
+                self._connection.commit()
+                for text, vector in zip(misses, embedded):
+                    vectors[text] = tuple(vector)
+                    self._remember(text, vectors[text])
+
+        return [list(vectors[text]) for text in texts]
+
+    def _key(self, text: str) -> bytes:
+        """Persistent table key for a query text"""
+        return hashlib.sha256(f"{self.namespace}\0{text}".encode()).digest()
+
+    def _remember(self, text: str, vector: Tuple[float, ...]) -> None:
+        """Add a vector to the in-memory LRU; the caller holds the lock"""
+        self._memory[text] = vector
+        self._memory.move_to_end(text)
+        if len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Documents are embedded once at build time, so they go straight to the model"""
+        return self.embeddings.embed_documents(texts)
+
+class SemanticCache:
+    """Thread-safe cache of results keyed by query embedding, hit on near-duplicate paraphrases"""
+
+    def __init__(self, embeddings: Any, path: Optional[str] = None, threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 ttl: float = SEMANTIC_CACHE_TTL, maxsize: int = 512):
+        self.embeddings = embeddings
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.maxsize = maxsize
+        # Contiguous float32 matrix of unit-normalised query vectors. Rows [0, len(_entries))
+        # are live and aligned with _entries; it grows by doubling up to maxsize rows, then
+        # works as a ring buffer where _next is the slot of the oldest entry
+        self._vectors: Optional[np.ndarray] = None
+        self._next = 0
+        # (stored_at, guard, result) per entry
+        self._entries: List[Tuple[float, Hashable, Dict[str, Any]]] = []
+        self._lock = threading.Lock()
+        # Append-only JSONL session log, one line per stored entry
+        self._log: Optional[TextIO] = None
+        self._load()
+
+    @staticmethod
+    def normalize(vector: List[float]) -> np.ndarray:
+        """Unit-length float32 copy of an embedding, the form lookups and stored entries use"""
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embed and normalise a query so lookups are a plain dot product"""
+        return self.normalize(self.embeddings.embed_query(text))
+
+    async def aembed(self, text: str) -> np.ndarray:
+        """Async embed, so batching embeddings can coalesce concurrent queries"""
+        return self.normalize(await self.embeddings.aembed_query(text))
+
+    def get(self, vector: np.ndarray, guard: Hashable) -> Optional[Dict[str, Any]]:
+        """Return a copy of the closest fresh result with the same guard, if similar enough"""
+        with self._lock:
+            if not self._entries:
+                return None
+
+            # One matrix-vector product scores every entry; only those above the threshold are ranked
+            similarities = self._vectors[:len(self._entries)] @ vector
+            candidates = np.flatnonzero(similarities >= self.threshold)
+            oldest_allowed = time.time() - self.ttl
+            for index in candidates[np.argsort(similarities[candidates])[::-1]]:
+                stored_at, entry_guard, result = self._entries[index]
+                # The guard (e.g. the SQL branch) must match so paraphrases about
+                # different products never share an answer
+                if entry_guard == guard and stored_at >= oldest_allowed:
+                    return dict(result)
+            return None
+
+    def put(self, vector: np.ndarray, guard: Hashable, result: Dict[str, Any], question: Optional[str] = None) -> None:
+        """Store a result, dropping the oldest entry when full, and append it to the session log"""
+        with self._lock:
+            stored_at = time.time()
+            entry = (stored_at, guard, dict(result))
+            size = len(self._entries)
+            if size < self.maxsize:
+                if self._vectors is None or size == len(self._vectors):
+                    self._grow(len(vector))
+                self._vectors[size] = vector
+                self._entries.append(entry)
+            else:
+                # Full: overwrite the oldest entry in place
+                self._vectors[self._next] = vector
+                self._entries[self._next] = entry
+                self._next = (self._next + 1) % self.maxsize
+            self._write_log(json.dumps({"t": stored_at, "g": guard, "q": question, "r": result, "e": vector.tolist()}) + "\n")
+
+    def clear(self) -> None:
+        """Drop all entries"""
+        with self._lock:
+            self._vectors = None
+            self._next = 0
+            self._entries = []
+            if self._log is not None:
+                self._log.truncate(0)
+
+    def _grow(self, dimension: int) -> None:
+        """Double the vector matrix capacity, up to maxsize rows; called with the lock held"""
+        capacity = 64 if self._vectors is None else len(self._vectors) * 2
+        vectors = np.empty((min(capacity, self.maxsize), dimension), dtype=np.float32)
+        if self._vectors is not None:
+            vectors[:len(self._vectors)] = self._vectors
+        self._vectors = vectors
+
+    def _load(self) -> None:
+        """Warm the cache from the most recent fresh entries logged by previous runs"""
+        if not self.path:
+            return
+        lines: Deque[str] = deque(maxlen=self.maxsize)
+        total = 0
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    for total, line in enumerate(f, 1):
+                        lines.append(line)
+            except Exception as e:
+                LOGGER.warning(f"[Semantic Cache] Could not read {self.path}: {e}")
+
+        vectors, entries, kept = [], [], []
+        oldest_allowed = time.time() - self.ttl
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A line cut short by a crash mid-write
+                continue
+            if record["t"] < oldest_allowed:
+                continue
+            vectors.append(np.asarray(record["e"], dtype=np.float32))
+            entries.append((record["t"], record["g"], record["r"]))
+            kept.append(line)
+        if entries:
+            self._vectors, self._entries = np.stack(vectors), entries
+            # Rows are loaded oldest first, so once full the oldest entry is always in slot 0
+            self._next = 0
+            LOGGER.info(f"[Semantic Cache] Warmed {len(entries)} entries from {self.path}")
+
+        try:
+            # Compact the log to the kept entries so it does not grow across restarts
+            if total > len(kept):
+                with open(self.path, "w", encoding="utf-8") as f:
+                    f.writelines(kept)
+            self._log = open(self.path, "a", encoding="utf-8", buffering=1)
+        except Exception as e:
+            LOGGER.warning(f"[Semantic Cache] Could not open {self.path}: {e}")
+
+    def _write_log(self, line: str) -> None:
+        """Append one entry to the session log; called with the lock held"""
+        if self._log is None:
+            return
+        try:
+            self._log.write(line)
+        except Exception as e:
+            LOGGER.warning(f"[Semantic Cache] Could not write {self.path}: {e}")
@@ -1,14 +1,104 @@
 import sqlite3
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
+from embeddings_service import embedding_namespace
+from vector_store import VECTOR_INDEX_DIR
 from langchain_core.documents import Document
+import hashlib
 import os
 
+# Hash of the data the persisted vector index was built from
+CONTENT_HASH_FILE = ".content_hash"
+# Files FAISS.save_local writes; the index is only reused when all of them exist
+INDEX_FILES = ("index.faiss", "index.pkl")
+
+# Older SQLite builds cap a statement at 999 bound parameters
+SQLITE_MAX_VARIABLES = 999
+
+def bulk_insert(c, sql_prefix, rows, chunk=500):
+    # Insert many rows per statement with a multi-row VALUES clause, chunked to stay under the parameter limit
+    if not rows:
+        return
+    cols = len(rows[0])
+    chunk = max(1, min(chunk, SQLITE_MAX_VARIABLES // cols))
+    row_placeholder = "(" + ", ".join("?" * cols) + ")"
+    for i in range(0, len(rows), chunk):
+        vals = rows[i:i + chunk]
+        placeholders = ", ".join([row_placeholder] * len(vals))
+        flat = [x for r in vals for x in r]
+        c.execute(f"{sql_prefix} VALUES {placeholders}", flat)
+
+def vector_store_is_current(persist_directory, content_hash):
+    # The saved index can be reused only if it is complete and was built from the same data
+    hash_path = os.path.join(persist_directory, CONTENT_HASH_FILE)
+    if not all(os.path.exists(os.path.join(persist_directory, name)) for name in (CONTENT_HASH_FILE,) + INDEX_FILES):
+        return False
+    with open(hash_path) as f:
+        return f.read() == content_hash
+
+def build_vector_store(c, persist_directory):
+    # faiss and the embedding model pull in heavy native libraries, so only load them when embedding
+    from vector_store import create_vector_store
+    from embeddings_service import create_embeddings
+
+    # Create enhanced vector store with more detailed documents
+    docs = []
+    # Category name and retailer price range for every product in one query
+    c.execute('''
+        SELECT p.id, p.name, p.description, p.brand, p.model, cat.name, MIN(r.price), MAX(r.price), AVG(r.price)
+        FROM products p
+        JOIN categories cat ON p.category_id = cat.id
+        LEFT JOIN retailers r ON r.product_id = p.id
+        GROUP BY p.id
+        ORDER BY p.id
+    ''')
+    for product_id, name, description, brand, model, category_name, min_price, max_price, avg_price in c.fetchall():
+        # Create enhanced document content
+        enhanced_content = f"""
+        Product: {name}
+        Brand: {brand}
+        Model: {model}
+        Category: {category_name}
+        Description: {description}
+        Price Range: ${min_price:.2f} - ${max_price:.2f}
+        Average Price: ${avg_price:.2f}
+        
+        This {name} is a {category_name.lower()} product from {brand}. {description}
+        Available at multiple retailers with prices ranging from ${min_price:.2f} to ${max_price:.2f}.
+        """
+        
+        doc = Document(
+            page_content=enhanced_content,
+            metadata={
+                "product_id": product_id,
+                "name": name,
+                "brand": brand,
+                "model": model,
+                "category": category_name,
+                "min_price": min_price,
+                "max_price": max_price,
+                "avg_price": avg_price
+            }
+        )
+        docs.append(doc)
+
+    # Initialize embeddings
+    embeddings = create_embeddings()
+
+    # Create and persist the FAISS HNSW vector store
+    print("Creating FAISS vector store...")
+    create_vector_store(docs, embeddings, persist_directory)
+    print("FAISS vector store created and persisted.")
+
 def setup_database_and_vector_store():
     # Connect to SQLite database
     conn = sqlite3.connect('products.db')
     c = conn.cursor()
 
+    # Setup is a one-off bulk load: skip fsyncs and keep temp data in memory
+    c.executescript('PRAGMA journal_mode=WAL; PRAGMA synchronous=OFF; PRAGMA temp_store=MEMORY; PRAGMA cache_size=-65536;')
+
+    # Build the whole schema and data set in a single transaction
+    c.execute('BEGIN')
+
     # Drop tables if they exist
     c.execute('DROP TABLE IF EXISTS retailers')
     c.execute('DROP TABLE IF EXISTS products')
@@ -50,9 +140,14 @@ def setup_database_and_vector_store():
         )
     ''')
 
+    # Index the join/filter columns used by the agents' product, category and price lookups
+    c.execute('CREATE INDEX IF NOT EXISTS idx_retailers_product_id ON retailers(product_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_products_category_id ON products(category_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_retailers_price ON retailers(price)')
+
     # Insert categories
     categories = [('Electronics',), ('Books',), ('Home Goods',)]
-    c.executemany('INSERT INTO categories (name) VALUES (?)', categories)
+    bulk_insert(c, 'INSERT INTO categories (name)', categories)
 
     # Insert products without price
     products = [
@@ -65,7 +160,7 @@ def setup_database_and_vector_store():
         (7, 'Tablet', 'A versatile tablet perfect for reading and media consumption.', 1, 'TabletCorp', 'TC-Tab10'),
         (8, 'Headphones', 'Wireless noise-canceling headphones with premium sound quality.', 1, 'AudioTech', 'AT-Wireless'),
     ]
-    c.executemany('INSERT INTO products (id, name, description, category_id, brand, model) VALUES (?, ?, ?, ?, ?, ?)', products)
+    bulk_insert(c, 'INSERT INTO products (id, name, description, category_id, brand, model)', products)
 
     # Insert multiple retailers for each product with different prices
     retailers = [
@@ -120,71 +215,24 @@ def setup_database_and_vector_store():
         ('GadgetHub', 8, 199.99, 45, 'Los Angeles, CA', 'support@gadgethub.com', 4.2),
     ]
     
-    c.executemany('INSERT INTO retailers (name, product_id, price, stock, location, contact, rating) VALUES (?, ?, ?, ?, ?, ?, ?)', retailers)
+    bulk_insert(c, 'INSERT INTO retailers (name, product_id, price, stock, location, contact, rating)', retailers)
 
     conn.commit()
 
-    # Create enhanced vector store with more detailed documents
-    docs = []
-    for product in products:
-        product_id, name, description, category_id, brand, model = product
-        
-        # Get category name
-        c.execute('SELECT name FROM categories WHERE id = ?', (category_id,))
-        category_name = c.fetchone()[0]
-        
-        # Get price range from retailers
-        c.execute('SELECT MIN(price), MAX(price), AVG(price) FROM retailers WHERE product_id = ?', (product_id,))
-        price_info = c.fetchone()
-        min_price, max_price, avg_price = price_info
-        
-        # Create enhanced document content
-        enhanced_content = f"""
-        Product: {name}
-        Brand: {brand}
-        Model: {model}
-        Category: {category_name}
-        Description: {description}
-        Price Range: ${min_price:.2f} - ${max_price:.2f}
-        Average Price: ${avg_price:.2f}
-        
-        This {name} is a {category_name.lower()} product from {brand}. {description}
-        Available at multiple retailers with prices ranging from ${min_price:.2f} to ${max_price:.2f}.
-        """
-        
-        doc = Document(
-            page_content=enhanced_content,
-            metadata={
-                "product_id": product_id,
-                "name": name,
-                "brand": brand,
-                "model": model,
-                "category": category_name,
-                "min_price": min_price,
-                "max_price": max_price,
-                "avg_price": avg_price
-            }
-        )
-        docs.append(doc)
-
-    # Initialize embeddings
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-
-    # Create and persist ChromaDB vector store
-    persist_directory = "./chroma_db"
-    if not os.path.exists(persist_directory):
-        os.makedirs(persist_directory)
-
-    print("Creating ChromaDB vector store...")
-    vector_store = Chroma.from_documents(
-        documents=docs,
-        embedding=embeddings,
-        persist_directory=persist_directory
-    )
-    print("ChromaDB vector store created and persisted.")
+    # Re-embed only when the catalog (or the embedding model) changed since the last build
+    persist_directory = VECTOR_INDEX_DIR
+    content_hash = hashlib.sha256(repr((embedding_namespace(), products, retailers)).encode()).hexdigest()
+    if vector_store_is_current(persist_directory, content_hash):
+        print("Vector store up to date, skipping embed")
+    else:
+        if not os.path.exists(persist_directory):
+            os.makedirs(persist_directory)
+        build_vector_store(c, persist_directory)
+        with open(os.path.join(persist_directory, CONTENT_HASH_FILE), "w") as f:
+            f.write(content_hash)
 
     conn.close()
-    print("Database and ChromaDB vector store created successfully.")
+    print("Database and FAISS vector store created successfully.")
     print(f"Created {len(products)} products with {len(retailers)} retailer entries.")
 
 if __name__ == "__main__":
@@ -0,0 +1,101 @@
+"""
+Embedding model shared by the vector store build and the chatbot
+"""
+
+import os
+from typing import List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from cache import CachedEmbeddings
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_BATCH_SIZE = 64
+
+# Optional int8-quantized ONNX export of the model, used instead of PyTorch when present
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", "models/all-MiniLM-L6-v2-onnx")
+ONNX_MODEL_FILE = "all-MiniLM-L6-v2-quant.onnx"
+ONNX_TOKENIZER_FILE = "tokenizer.json"
+# sentence-transformers truncates all-MiniLM-L6-v2 inputs at 256 tokens
+MAX_SEQUENCE_LENGTH = 256
+
+class OnnxMiniLMEmbeddings(Embeddings):
+    """all-MiniLM-L6-v2 on ONNX Runtime, mean pooled and normalised like sentence-transformers"""
+
+    def __init__(self, model_dir: str = EMBEDDING_ONNX_DIR, batch_size: int = EMBEDDING_BATCH_SIZE):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, ONNX_MODEL_FILE), providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, ONNX_TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=MAX_SEQUENCE_LENGTH)
+        self.tokenizer.enable_padding()
+        self.batch_size = batch_size
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed one query"""
+        return self._encode([text])[0]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed documents in batches of batch_size"""
+        vectors: List[List[float]] = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self._encode(texts[start:start + self.batch_size]))
+        return vectors
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        """Run one padded batch through the model"""
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            inputs["token_type_ids"] = np.array([encoding.type_ids for encoding in encodings], dtype=np.int64)
+
+        token_embeddings = self.session.run(None, inputs)[0]
+        # Mean over real tokens only, then unit length (normalize_embeddings=True)
+        mask = attention_mask[..., np.newaxis].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.tolist()
+
+def use_onnx() -> bool:
+    """Whether the quantized ONNX export is available"""
+    return os.path.exists(os.path.join(EMBEDDING_ONNX_DIR, ONNX_MODEL_FILE))
+
+def embedding_namespace() -> str:
+    """Identifies the model variant whose vectors are cached and stored in the vector index"""
+    return f"{EMBEDDING_MODEL_NAME}-onnx-int8" if use_onnx() else EMBEDDING_MODEL_NAME
+
+def create_embeddings() -> CachedEmbeddings:
+    """
+    Create the sentence-transformers embedding model behind a persistent query cache
+
+    Documents are encoded in large batches and every vector is normalised, so
+    the vector store build and query-time lookups must both use this helper.
+    When the int8 ONNX export exists it replaces PyTorch entirely; otherwise
+    half precision is only used on GPU, as on CPU FP16 is not faster.
+
+    Returns:
+        Embedding model wrapped so repeated query texts skip it
+    """
+    if use_onnx():
+        return CachedEmbeddings(OnnxMiniLMEmbeddings(), namespace=embedding_namespace())
+
+    # Heavy ML imports are deferred until the model is actually needed
+    import torch
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    if torch.cuda.is_available():
+        device, dtype = "cuda", torch.float16
+    else:
+        device, dtype = "cpu", torch.float32
+
+    embeddings = HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL_NAME,
+        model_kwargs={"device": device, "model_kwargs": {"torch_dtype": dtype}},
+        encode_kwargs={"batch_size": EMBEDDING_BATCH_SIZE, "normalize_embeddings": True}
+    )
+    return CachedEmbeddings(embeddings, namespace=embedding_namespace())
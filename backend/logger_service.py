@@ -1,13 +1,15 @@
 import logging
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+@lru_cache(maxsize=None)
 def setup_logger(name: str = "RAGChatbot") -> logging.Logger:
     """
-    Setup and return a configured logger instance
+    Setup and return a configured logger instance, memoised per name
     
     Args:
         name: Logger name (default: "RAGChatbot")
@@ -1,21 +1,42 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 import os
 from dotenv import load_dotenv
 from langchain_nvidia_ai_endpoints import ChatNVIDIA
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.utilities import SQLDatabase
-from langchain_core.prompts import PromptTemplate, ChatPromptTemplate
+from embeddings_service import create_embeddings
+from vector_store import load_vector_store
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from langchain_core.runnables import RunnablePassthrough, RunnableLambda
 from langchain.chains import create_sql_query_chain
 from langchain_community.tools import QuerySQLDatabaseTool
+from agents.agent_manager import AgentManager, create_products_database
+from agents.base_agent import AgentStatus
+from agents.formatting import fmt_price, get_retailer_icon, get_stock_status
+from agents.query import Query
 from operator import itemgetter
-from typing import Dict, Any, List
+from functools import lru_cache
+from itertools import islice
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from types import MappingProxyType
+from typing import Dict, Any, AsyncIterator, List, Mapping, Optional, Tuple
+from cachetools import LRUCache
+import hashlib
+import httpx
+import requests
+import secrets
 import time
 import asyncio
+import re
+import ahocorasick
+import numpy as np
+import orjson
+import anyio.to_thread
 
 load_dotenv()
 
@@ -23,7 +44,287 @@ load_dotenv()
 from logger_service import get_logger
 LOGGER = get_logger()
 
-app = FastAPI(title="Sample Multi Agent RAG LLM Chatbot API", description="A sample multi-agent RAG LLM chatbot with specialized AI agents using LangChain", docs_url=None, redoc_url=None)
+# Cache LLM responses for all chains and agents
+from cache import SemanticCache, setup_llm_cache
+setup_llm_cache()
+
+from batching import TOKEN_SINK, EmbeddingBatcher, LLMBatcher
+
+# Chat answers are reused only for near-verbatim repeats of a question
+CHAT_SEMANTIC_CACHE_PATH = ".chat_semantic_cache.jsonl"
+CHAT_SEMANTIC_CACHE_THRESHOLD = float(os.getenv("CHAT_SEMANTIC_CACHE_THRESHOLD", "0.95"))
+CHAT_SEMANTIC_CACHE_GUARD = "chat"
+# Most recent answers kept, and reloaded from the session log on startup
+CHAT_SEMANTIC_CACHE_SIZE = 10000
+
+# Confidently routed agent answers, reused for repeated (exact) and paraphrased (semantic) messages
+AGENT_EXACT_CACHE_SIZE = 4096
+AGENT_SEMANTIC_CACHE_PATH = ".agent_semantic_cache.jsonl"
+AGENT_SEMANTIC_CACHE_THRESHOLD = float(os.getenv("AGENT_SEMANTIC_CACHE_THRESHOLD", "0.95"))
+AGENT_SEMANTIC_CACHE_SIZE = 4096
+
+# Documents retrieved per question, and retriever results kept for repeated questions
+RETRIEVER_K = 3
+RETRIEVAL_CACHE_SIZE = 2048
+
+# Upper bound on concurrent NVIDIA requests from the chatbot chains
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+# Upper bound on SQLite queries running at once on worker threads
+DB_MAX_CONCURRENCY = int(os.getenv("DB_MAX_CONCURRENCY", "8"))
+# Threads for blocking work: agent routing, SQLite queries and the sync endpoints
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", "64"))
+
+# Shared secret for the /admin endpoints, sent as X-Admin-Token; unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN") or None
+
+# OpenAI-compatible endpoint serving the model, e.g. a self-hosted NIM or vLLM; unset uses the NVIDIA API
+LLM_BASE_URL = os.getenv("LLM_BASE_URL") or None
+
+# Keyword routing used when the LLM router is unavailable, in priority order
+_ROUTE_KEYWORDS = (
+    ("SQL", ("product", "price", "stock", "category", "laptop", "smartphone", "cost", "buy")),
+    ("VECTOR", ("recommend", "suggest", "best", "compare", "like", "similar")),
+)
+
+# Questions answered by a canned SQL query, in priority order
+_SQL_INTENT_KEYWORDS = (
+    ("laptop", ("laptop",)),
+    ("smartphone", ("smartphone",)),
+    ("electronics", ("electronics",)),
+    ("books", ("books",)),
+    ("categories", ("categories",)),
+    ("retailers", ("retailers",)),
+    ("product_list", ("what products", "products available")),
+    ("products", ("products",)),
+)
+
+# Canned SQL for each intent, run directly without the LLM
+_CANNED_SQL = {
+    "laptop": "SELECT p.name, c.name as category, MIN(r.price) as min_price, MAX(r.price) as max_price FROM products p JOIN categories c ON p.category_id = c.id JOIN retailers r ON p.id = r.product_id WHERE p.name LIKE '%Laptop%' GROUP BY p.id LIMIT 5;",
+    "smartphone": "SELECT p.name, c.name as category, MIN(r.price) as min_price, MAX(r.price) as max_price FROM products p JOIN categories c ON p.category_id = c.id JOIN retailers r ON p.id = r.product_id WHERE p.name LIKE '%Smartphone%' GROUP BY p.id LIMIT 5;",
+    "electronics": "SELECT p.name, c.name as category, MIN(r.price) as min_price, MAX(r.price) as max_price FROM products p JOIN categories c ON p.category_id = c.id JOIN retailers r ON p.id = r.product_id WHERE c.name = 'Electronics' GROUP BY p.id LIMIT 5;",
+    "books": "SELECT p.name, c.name as category, MIN(r.price) as min_price, MAX(r.price) as max_price FROM products p JOIN categories c ON p.category_id = c.id JOIN retailers r ON p.id = r.product_id WHERE c.name = 'Books' GROUP BY p.id LIMIT 5;",
+    "categories": "SELECT name FROM categories;",
+    "retailers": "SELECT r.name, p.name as product, r.price, r.stock FROM retailers r JOIN products p ON r.product_id = p.id LIMIT 5;",
+    "product_list": "SELECT p.name, c.name as category FROM products p JOIN categories c ON p.category_id = c.id ORDER BY c.name, p.name;",
+    "products": "SELECT p.name, c.name as category, MIN(r.price) as min_price, MAX(r.price) as max_price FROM products p JOIN categories c ON p.category_id = c.id JOIN retailers r ON p.id = r.product_id GROUP BY p.id LIMIT 10;",
+}
+
+# Canned answers to greetings and help requests, matched in order as substrings of the message.
+# Read-only, as every request reads this shared table
+_SIMPLE_RESPONSES: Mapping[str, str] = MappingProxyType({
+    "hi": "Hello! I'm your shopping assistant and I can help you with product searches. You can ask me:\n• 'What products are available?'\n• 'Show me laptops'\n• 'Smartphone prices'",
+    "hello": "Hello! I'm your shopping assistant. How can I help you today?",
+    "help": "I can help you with:\n• Product search\n• Price information\n• Category-wise products\n• Retailer information\n• Product recommendations",
+    "thanks": "You're welcome! 😊 Is there anything else you'd like to know?",
+    "thank you": "I'm happy to help! 😊 Feel free to ask more questions."
+})
+
+def _build_simple_response_automaton() -> ahocorasick.Automaton:
+    """Compile the simple response keywords into one Aho-Corasick automaton"""
+    automaton = ahocorasick.Automaton()
+    for priority, (keyword, response) in enumerate(_SIMPLE_RESPONSES.items()):
+        automaton.add_word(keyword, (priority, keyword, response))
+    automaton.make_automaton()
+    return automaton
+
+_SIMPLE_RESPONSE_AUTOMATON = _build_simple_response_automaton()
+
+# A message that is only a simple response keyword, e.g. "Hi!" or "thank you."
+_SIMPLE_MESSAGE_RE = re.compile(
+    r"\s*(" + "|".join(map(re.escape, sorted(_SIMPLE_RESPONSES, key=len, reverse=True))) + r")[\s!.?]*",
+    re.IGNORECASE
+)
+
+def _simple_message_response(message: str) -> Optional[str]:
+    """Canned answer when the whole message is a greeting, thanks or help request"""
+    match = _SIMPLE_MESSAGE_RE.fullmatch(message)
+    return _SIMPLE_RESPONSES[match.group(1).lower()] if match else None
+
+def _build_keyword_automaton() -> ahocorasick.Automaton:
+    """Compile the route and intent keywords into one Aho-Corasick automaton"""
+    tags: Dict[str, List[Tuple[str, int, str]]] = {}
+    for kind, table in (("route", _ROUTE_KEYWORDS), ("intent", _SQL_INTENT_KEYWORDS)):
+        for priority, (label, keywords) in enumerate(table):
+            for keyword in keywords:
+                tags.setdefault(keyword, []).append((kind, priority, label))
+    
+    automaton = ahocorasick.Automaton()
+    for keyword, values in tags.items():
+        automaton.add_word(keyword, tuple(values))
+    automaton.make_automaton()
+    return automaton
+
+_KEYWORD_AUTOMATON = _build_keyword_automaton()
+
+def _match_keywords(message_lower: str) -> Tuple[str, Optional[str]]:
+    """Keyword route and canned SQL intent of a lowercased message, found in one pass"""
+    best: Dict[str, Tuple[int, str]] = {}
+    for _, values in _KEYWORD_AUTOMATON.iter(message_lower):
+        for kind, priority, label in values:
+            if kind not in best or priority < best[kind][0]:
+                best[kind] = (priority, label)
+    
+    route = best["route"][1] if "route" in best else "LLM"
+    intent = best["intent"][1] if "intent" in best else None
+    return route, intent
+
+# Substrings of an NVIDIA API error that mark it as rate limiting
+_RATE_LIMIT_MARKERS = ("429", "Too Many Requests")
+
+def _is_rate_limited(error_str: str) -> bool:
+    """Whether an error message reports an API rate limit"""
+    return any(marker in error_str for marker in _RATE_LIMIT_MARKERS)
+
+def _is_rate_limit_error(error: BaseException) -> bool:
+    """Whether an exception, or one it was raised from, is an HTTP 429 from the LLM endpoint"""
+    cause: Optional[BaseException] = error
+    while cause is not None:
+        if isinstance(cause, (requests.HTTPError, httpx.HTTPStatusError)) and cause.response is not None:
+            return cause.response.status_code == 429
+        cause = cause.__cause__ or cause.__context__
+    # ChatNVIDIA re-raises HTTP errors as plain Exceptions, so the message is the fallback
+    return _is_rate_limited(str(error))
+
+_RATE_LIMIT_RESPONSE = "I'm happy you're chatting with me! However, the NVIDIA API rate limit has been exceeded. Please try again in a few seconds. 😊\n\nAlternatively, you can ask:\n• 'What products do you have?' (answered from database)\n• General questions about products and categories"
+
+# Tuple shapes in QuerySQLDatabaseTool output, e.g. [('Laptop', 'Electronics', 1200.0)]
+_CATEGORY_RE = re.compile(r"\('([^']+)',\)")
+_SIMPLE_RE = re.compile(r"\('([^']+)',\s*'([^']+)'\)")
+_RETAILER_RE = re.compile(r"\('([^']+)',\s*'([^']+)',\s*([0-9]+)\)")
+_PRODUCT_RE = re.compile(r"\('([^']+)',\s*'([^']+)',\s*([0-9.]+)\)")
+
+# Product name keyword -> picsum image ID, in priority order
+_PRODUCT_IMAGE_IDS = (
+    ('laptop', '1'), ('smartphone', '2'), ('phone', '2'), ('book', '3'),
+    ('novel', '3'), ('cookbook', '4'), ('coffee', '5'), ('maker', '5'),
+    ('chair', '6'), ('desk', '6'), ('tablet', '7'), ('watch', '8'),
+    ('headphones', '9'), ('speaker', '10'), ('camera', '11'), ('mouse', '12'),
+    ('keyboard', '13'), ('monitor', '14'), ('printer', '15')
+)
+_DEFAULT_IMAGE_ID = '16'
+
+def _build_image_automaton() -> ahocorasick.Automaton:
+    """Compile the image keywords into one Aho-Corasick automaton"""
+    automaton = ahocorasick.Automaton()
+    for priority, (keyword, image_id) in enumerate(_PRODUCT_IMAGE_IDS):
+        automaton.add_word(keyword, (priority, image_id))
+    automaton.make_automaton()
+    return automaton
+
+_PRODUCT_IMAGE_AUTOMATON = _build_image_automaton()
+
+_PRODUCT_CARD_TEMPLATE = """🛍️ **{name}**
+📂 Category: {category}
+💰 Price: {price}
+🖼️ Image: {image}
+
+"""
+
+_CATEGORY_CARD_TEMPLATE = """{icon} **{category}**
+📝 {description}
+🔍 *Try: "Show me {category_lower}"*
+
+"""
+
+_RETAILER_CARD_TEMPLATE = """{icon} **{retailer_name}**
+🛍️ Product: {product_name}
+📊 {stock_status}
+📍 *Contact store for pricing and availability*
+
+"""
+
+# Lowercased category name -> icon and description for the category cards
+_CATEGORY_ICONS: Dict[str, str] = {
+    'electronics': '💻',
+    'books': '📚',
+    'home goods': '🏠',
+    'clothing': '👕',
+    'sports': '⚽',
+    'toys': '🧸',
+    'automotive': '🚗',
+    'beauty': '💄',
+    'health': '💊',
+    'food': '🍕',
+    'music': '🎵',
+    'games': '🎮'
+}
+
+_CATEGORY_DESCRIPTIONS: Dict[str, str] = {
+    'electronics': 'Laptops, smartphones, gadgets & tech accessories',
+    'books': 'Fiction, non-fiction, educational & reference books',
+    'home goods': 'Furniture, kitchen appliances & home decor',
+    'clothing': 'Fashion, apparel & accessories',
+    'sports': 'Sports equipment & fitness gear',
+    'toys': 'Kids toys, games & educational items',
+    'automotive': 'Car accessories & automotive tools',
+    'beauty': 'Cosmetics, skincare & beauty products',
+    'health': 'Health supplements & wellness products',
+    'food': 'Groceries, snacks & beverages',
+    'music': 'Musical instruments & audio equipment',
+    'games': 'Video games & board games'
+}
+
+def _compile_prompt(template: str) -> RunnableLambda:
+    """Prompt step for a fixed template; the static text is split out once, so each call only joins in the variables"""
+    parts = re.split(r"\{(\w+)\}", template)
+    literals, names = parts[0::2], parts[1::2]
+    
+    def render(inputs: Dict[str, Any]) -> str:
+        rendered = [literals[0]]
+        for name, literal in zip(names, literals[1:]):
+            rendered.append(str(inputs[name]))
+            rendered.append(literal)
+        return "".join(rendered)
+    
+    return RunnableLambda(render)
+
+def _orjson_default(obj: Any) -> Any:
+    """Serialize the types orjson does not know, e.g. the read-only agent_info mappings"""
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+class AppJSONResponse(ORJSONResponse):
+    """orjson encoded response that also accepts read-only mappings"""
+    
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build the chatbot and agents, and size the thread pools behind asyncio.to_thread and the sync endpoints"""
+    # Agent calls hold a thread for a whole LLM round trip, so the small defaults would cap concurrency
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=WORKER_THREADS, thread_name_prefix="worker")
+    )
+    anyio.to_thread.current_default_thread_limiter().total_tokens = WORKER_THREADS
+    # Load the models, vector store and agents before the first request
+    chatbot = get_chatbot()
+    get_agent_router()
+    await asyncio.to_thread(chatbot.warmup)
+    # Agent embeddings, computed on worker threads, are batched with the chatbot's on this loop
+    if chatbot.embedding_batcher is not None:
+        chatbot.embedding_batcher.bind(asyncio.get_running_loop())
+    yield
+
+app = FastAPI(title="Sample Multi Agent RAG LLM Chatbot API", description="A sample multi-agent RAG LLM chatbot with specialized AI agents using LangChain", docs_url=None, redoc_url=None, lifespan=lifespan,
+              default_response_class=AppJSONResponse)
+
+# Registered before CORSMiddleware so it runs inside it: an app-level Exception handler would run
+# outside CORS, and the cross-origin frontend could not read the error response
+@app.middleware("http")
+async def handle_unexpected_error(request: Request, call_next):
+    """Answer any request that raised with a chat-shaped error, so endpoints need no try/except of their own"""
+    try:
+        return await call_next(request)
+    except Exception as e:
+        if _is_rate_limit_error(e):
+            LOGGER.warning("[API] %s hit the NVIDIA API rate limit: %s", request.url.path, e)
+            # A 200, as before: the frontend only renders the response text of successful replies
+            return AppJSONResponse({"response": _RATE_LIMIT_RESPONSE, "source": "rate_limit"})
+        LOGGER.error("[API] %s failed: %s", request.url.path, e)
+        return AppJSONResponse({"response": f"Sorry, I encountered an error: {e}", "source": "api_error"}, status_code=500)
 
 # Add CORS middleware
 app.add_middleware(
@@ -37,6 +338,8 @@ app.add_middleware(
 class ChatRequest(BaseModel):
     message: str
 
+# /api/chat returns AppJSONResponse directly, so only ChatRequest, which comes from the client,
+# is validated; ChatResponse documents the response schema
 class ChatResponse(BaseModel):
     response: str
     source: str  # "sql", "vector", "llm"
@@ -44,14 +347,24 @@ class ChatResponse(BaseModel):
 class RAGChatbot:
     def __init__(self):
         self.llm = None
+        self.llm_batcher = None
         self.embeddings = None
+        self.embedding_batcher = None
         self.vector_store = None
         self.retriever = None
+        self._retrieval_cache: "OrderedDict[str, Tuple[Document, ...]]" = OrderedDict()
         self.db = None
         self.sql_chain = None
+        self._sql_tool = None
+        self._canned_responses: Dict[str, str] = {}
         self.vector_chain = None
         self.router_chain = None
+        self.semantic_cache = None
+        self._llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+        self._db_semaphore = asyncio.Semaphore(DB_MAX_CONCURRENCY)
         self.initialize_components()
+        # Components never change after startup, so /health serves this snapshot
+        self.components = self._snapshot_components()
         
     def initialize_components(self):
         """Initialize all LangChain components"""
@@ -68,19 +381,30 @@ class RAGChatbot:
         self.llm = ChatNVIDIA(
             model=model_name,
             nvidia_api_key=self.nvidia_api_key,
+            base_url=LLM_BASE_URL,
             temperature=0.7,
             max_tokens=1024
         )
+        # Concurrent chain calls share batched requests to the model
+        self.llm_batcher = LLMBatcher(self.llm)
         LOGGER.info("✓ LLM initialized with API key from environment")
         
         # Initialize embeddings
-        self.embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+        self.embeddings = create_embeddings()
+        # Concurrent async query embeddings share one batched forward pass
+        self.embedding_batcher = EmbeddingBatcher(self.embeddings)
         LOGGER.info("✓ Embeddings initialized")
         
+        # Near-identical questions are answered from earlier responses
+        self.semantic_cache = SemanticCache(
+            self.embedding_batcher, path=CHAT_SEMANTIC_CACHE_PATH, threshold=CHAT_SEMANTIC_CACHE_THRESHOLD,
+            maxsize=CHAT_SEMANTIC_CACHE_SIZE
+        )
+        
         # Initialize vector store
         try:
-            self.vector_store = Chroma(persist_directory="./chroma_db", embedding_function=self.embeddings)
-            self.retriever = self.vector_store.as_retriever(search_kwargs={"k": 3})
+            self.vector_store = load_vector_store(self.embeddings)
+            self.retriever = self.vector_store.as_retriever(search_kwargs={"k": RETRIEVER_K})
             self._setup_vector_chain()
             LOGGER.info("✓ Vector store and retriever initialized")
         except Exception as e:
@@ -88,8 +412,9 @@ class RAGChatbot:
             
         # Initialize SQL database
         try:
-            self.db = SQLDatabase.from_uri("sqlite:///products.db")
+            self.db = create_products_database()
             self._setup_sql_chain()
+            self.refresh_cache()
             LOGGER.info("✓ SQL database initialized")
         except Exception as e:
             LOGGER.warning(f"⚠ SQL database initialization failed: {e}")
@@ -98,12 +423,31 @@ class RAGChatbot:
         self._setup_router()
         LOGGER.info("✓ RAG Chatbot fully initialized")
         
+    def warmup(self) -> None:
+        """Run one query through the embedding model and the vector index so the first request does not pay their first-call cost"""
+        # The raw model, as the query cache would skip it on every start after the first
+        vector = self.embeddings.embeddings.embed_query("warmup")
+        if self.vector_store is not None:
+            self.vector_store.similarity_search_by_vector(vector, k=1)
+        LOGGER.info("✓ Embedding model and vector store warmed up")
+        
+    def _snapshot_components(self) -> Dict[str, bool]:
+        """Which components initialized successfully"""
+        return {
+            "llm": self.llm is not None,
+            "vector_store": self.vector_store is not None,
+            "sql_database": self.db is not None,
+            "sql_chain": self.sql_chain is not None,
+            "vector_chain": self.vector_chain is not None,
+            "router": self.router_chain is not None
+        }
+        
     def _setup_vector_chain(self):
         """Setup LangChain for vector search"""
         if not self.retriever:
             return
             
-        vector_prompt = ChatPromptTemplate.from_template("""
+        vector_prompt = _compile_prompt("""
         You are a helpful assistant. Answer the user's question based on the provided context.
         If the context doesn't contain enough information to answer the question, say so.
         
@@ -123,7 +467,7 @@ class RAGChatbot:
                 "question": itemgetter("question")
             }
             | vector_prompt
-            | self.llm
+            | self.llm_batcher.as_runnable(streamable=True)
             | StrOutputParser()
         )
         
@@ -133,7 +477,7 @@ class RAGChatbot:
             return
             
         # Create custom SQL query generation chain with proper table info
-        sql_query_prompt = PromptTemplate.from_template(
+        sql_query_prompt = _compile_prompt(
            """Given an input question, first create a syntactically correct SQLite query to run.
            Unless the user specifies a specific number of examples they wish to obtain, always limit your query to at most 5 results.
            You can order the results by a relevant column to return the most interesting examples in the database.
@@ -156,15 +500,15 @@ class RAGChatbot:
         
         sql_query_chain = (
             sql_query_prompt
-            | self.llm.bind(stop=["\nSQLResult:"])
+            | self.llm_batcher.as_runnable(stop=["\nSQLResult:"])
             | StrOutputParser()
         )
         
-        # Create SQL execution tool
-        sql_tool = QuerySQLDatabaseTool(db=self.db)
+        # Create SQL execution tool, also used for the canned queries in chat()
+        self._sql_tool = QuerySQLDatabaseTool(db=self.db)
         
         # Create response generation prompt
-        sql_response_prompt = ChatPromptTemplate.from_template("""
+        sql_response_prompt = _compile_prompt("""
         Based on the user's question and the SQL query results, provide a natural language response.
         
         Question: {question}
@@ -177,16 +521,16 @@ class RAGChatbot:
         self.sql_chain = (
             {
                 "question": itemgetter("question"),
-                "result": itemgetter("question") | sql_query_chain | sql_tool
+                "result": itemgetter("question") | sql_query_chain | RunnableLambda(self._sql_tool.run, afunc=self._run_sql)
             }
             | sql_response_prompt
-            | self.llm
+            | self.llm_batcher.as_runnable(streamable=True)
             | StrOutputParser()
         )
         
     def _setup_router(self):
         """Setup intelligent routing between SQL and Vector search"""
-        router_prompt = ChatPromptTemplate.from_template("""
+        router_prompt = _compile_prompt("""
         You are an expert at routing user questions to the appropriate data source.
         
         Given a user question, choose the best source:
@@ -202,44 +546,33 @@ class RAGChatbot:
         self.router_chain = (
             {"question": itemgetter("question")}
             | router_prompt 
-            | self.llm 
+            | self.llm_batcher.as_runnable()
             | StrOutputParser()
         )
         
-    def _get_product_image(self, product_name: str, category: str) -> str:
-        """Get dummy image URL based on product name and category"""
-        # Using picsum.photos for dummy images with different seeds for variety
-        product_lower = product_name.lower()
-        
-        # Map products to appropriate image IDs from picsum
-        image_map = {
-            'laptop': '1',
-            'smartphone': '2', 
-            'phone': '2',
-            'book': '3',
-            'novel': '3',
-            'cookbook': '4',
-            'coffee': '5',
-            'maker': '5',
-            'chair': '6',
-            'desk': '6',
-            'tablet': '7',
-            'watch': '8',
-            'headphones': '9',
-            'speaker': '10',
-            'camera': '11',
-            'mouse': '12',
-            'keyboard': '13',
-            'monitor': '14',
-            'printer': '15'
-        }
+    def refresh_cache(self) -> int:
+        """Precompute the formatted response of every canned SQL query, e.g. again after products.db changes"""
+        responses = {}
+        for intent, sql_query in _CANNED_SQL.items():
+            try:
+                result = self._sql_tool.run(sql_query)
+            except Exception as e:
+                LOGGER.warning(f"[SQL Cache] Failed to precompute '{intent}': {e}")
+                continue
+            # Empty results are left to the SQL chain, as in chat()
+            if result:
+                responses[intent] = self._format_product_results(result)
         
-        # Find matching image ID
-        image_id = '16'  # default
-        for keyword, img_id in image_map.items():
-            if keyword in product_lower:
-                image_id = img_id
-                break
+        self._canned_responses = responses
+        LOGGER.info(f"✓ Precomputed {len(responses)} canned SQL responses")
+        return len(responses)
+        
+    def _get_product_image(self, product_lower: str, category: str) -> str:
+        """Get dummy image URL based on the lowercased product name and category"""
+        # Using picsum.photos for dummy images with different seeds for variety
+        # One pass finds every keyword in the name; the earliest in the map wins
+        matches = [value for _, value in _PRODUCT_IMAGE_AUTOMATON.iter(product_lower)]
+        image_id = min(matches)[1] if matches else _DEFAULT_IMAGE_ID
         
         # Return placeholder image URL
         return f"https://picsum.photos/200/200?random={image_id}"
@@ -247,18 +580,14 @@ class RAGChatbot:
     def _format_product_results(self, raw_result: str) -> str:
         """Format SQL results into a beautiful product display"""
         try:
-            import re
-            
             # Check if this is a categories result like [('Electronics',), ('Books',), ('Home Goods',)]
-            category_pattern = r"\('([^']+)',\)"
-            category_matches = re.findall(category_pattern, raw_result)
+            category_matches = _CATEGORY_RE.findall(raw_result)
             
             if category_matches:
                 return self._format_category_results(category_matches)
             
             # Check if this is a simple product list (name, category only)
-            simple_pattern = r"\('([^']+)',\s*'([^']+)'\)"
-            simple_matches = re.findall(simple_pattern, raw_result)
+            simple_matches = _SIMPLE_RE.findall(raw_result)
             
             if simple_matches and not any(char.isdigit() for char in raw_result if char not in "(),'"):
                 # Simple product list format
@@ -277,52 +606,37 @@ class RAGChatbot:
                 return f"🛍️ **Available Products:**\n\n{products_list}\n\n💡 *Ask about specific products for pricing and retailer info!*"
             
             # Check if this is a retailers result like [('MobileWorld', 'Smartphone', 100)]
-            retailer_pattern = r"\('([^']+)',\s*'([^']+)',\s*([0-9]+)\)"
-            retailer_matches = re.findall(retailer_pattern, raw_result)
+            retailer_matches = _RETAILER_RE.findall(raw_result)
             
             if retailer_matches and not raw_result.count('.') > 0:  # No decimal prices, likely retailers
                 return self._format_retailer_results(retailer_matches)
             
             # Extract products from tuple format like ('Laptop', 'Electronics', 1200.0)
-            pattern = r"\('([^']+)',\s*'([^']+)',\s*([0-9.]+)\)"
-            matches = re.findall(pattern, raw_result)
+            matches = _PRODUCT_RE.findall(raw_result)
             
             if not matches:
                 # Fallback for different formats
                 return f"Here are the results:\n\n{raw_result}"
             
-            formatted_products = []
-            for i, (name, category, price) in enumerate(matches):
-                # Get dummy image
-                image_url = self._get_product_image(name, category)
-                
-                # Format price
-                price_float = float(price)
-                if price_float >= 1000:
-                    price_formatted = f"${price_float:,.0f}"
-                else:
-                    price_formatted = f"${price_float:.2f}"
-                
-                # Create product card
-                product_card = f"""🛍️ **{name}**
-📂 Category: {category}
-💰 Price: {price_formatted}
-🖼️ Image: {image_url}
-
-"""
-                formatted_products.append(product_card)
+            # One card per product, each with a dummy image
+            cards = [
+                _PRODUCT_CARD_TEMPLATE.format(
+                    name=name,
+                    category=category,
+                    price=fmt_price(float(price)),
+                    image=self._get_product_image(name.lower(), category)
+                )
+                for name, category, price in matches
+            ]
             
             # Create header
             count = len(matches)
             header = f"🔍 **Found {count} product{'s' if count != 1 else ''}:**\n\n"
             
-            # Combine all
-            result = header + "".join(formatted_products)
-            
             # Add footer with suggestions
             footer = "💡 *Try asking for specific categories like 'electronics' or 'books'*"
             
-            return result + footer
+            return "".join((header, *cards, footer))
             
         except Exception as e:
             LOGGER.warning(f"[Format] Failed to format results: {e}")
@@ -331,65 +645,27 @@ class RAGChatbot:
     def _format_category_results(self, categories: list) -> str:
         """Format category results into a beautiful display"""
         try:
-            # Category icons mapping
-            category_icons = {
-                'electronics': '💻',
-                'books': '📚',
-                'home goods': '🏠',
-                'clothing': '👕',
-                'sports': '⚽',
-                'toys': '🧸',
-                'automotive': '🚗',
-                'beauty': '💄',
-                'health': '💊',
-                'food': '🍕',
-                'music': '🎵',
-                'games': '🎮'
-            }
-            
-            # Category descriptions
-            category_descriptions = {
-                'electronics': 'Laptops, smartphones, gadgets & tech accessories',
-                'books': 'Fiction, non-fiction, educational & reference books',
-                'home goods': 'Furniture, kitchen appliances & home decor',
-                'clothing': 'Fashion, apparel & accessories',
-                'sports': 'Sports equipment & fitness gear',
-                'toys': 'Kids toys, games & educational items',
-                'automotive': 'Car accessories & automotive tools',
-                'beauty': 'Cosmetics, skincare & beauty products',
-                'health': 'Health supplements & wellness products',
-                'food': 'Groceries, snacks & beverages',
-                'music': 'Musical instruments & audio equipment',
-                'games': 'Video games & board games'
-            }
-            
-            formatted_categories = []
-            for category in categories:
-                category_lower = category.lower()
-                icon = category_icons.get(category_lower, '📁')
-                description = category_descriptions.get(category_lower, 'Various products and items')
-                
-                category_card = f"""{icon} **{category}**
-📝 {description}
-🔍 *Try: "Show me {category_lower}"*
-
-"""
-                formatted_categories.append(category_card)
+            cards = [
+                _CATEGORY_CARD_TEMPLATE.format(
+                    icon=_CATEGORY_ICONS.get(category_lower, '📁'),
+                    category=category,
+                    description=_CATEGORY_DESCRIPTIONS.get(category_lower, 'Various products and items'),
+                    category_lower=category_lower
+                )
+                for category, category_lower in zip(categories, map(str.lower, categories))
+            ]
             
             # Create header
             count = len(categories)
             header = f"🏪 **Available Categories ({count}):**\n\n"
             
-            # Combine all
-            result = header + "".join(formatted_categories)
-            
             # Add footer with navigation help
             footer = """🎯 **Quick Actions:**
 • Ask "Show me electronics" to see tech products
 • Ask "What laptops do you have?" for specific items
 • Ask "Show me books under $20" for filtered results"""
             
-            return result + footer
+            return "".join((header, *cards, footer))
             
         except Exception as e:
             LOGGER.warning(f"[Format] Failed to format category results: {e}")
@@ -398,66 +674,21 @@ class RAGChatbot:
     def _format_retailer_results(self, retailers: list) -> str:
         """Format retailer results into a beautiful display"""
         try:
-            # Retailer type icons mapping
-            retailer_icons = {
-                'amazon': '📦',
-                'walmart': '🛒',
-                'target': '🎯',
-                'bestbuy': '🔌',
-                'apple': '🍎',
-                'samsung': '📱',
-                'mobilworld': '📱',
-                'mobileworld': '📱',
-                'techstore': '💻',
-                'bookstore': '📚',
-                'homestore': '🏠',
-                'electronics': '⚡',
-                'gadget': '🔧',
-                'phone': '📞',
-                'computer': '💻'
-            }
-            
-            # Stock status
-            def get_stock_status(stock):
-                stock_num = int(stock)
-                if stock_num > 50:
-                    return f"🟢 **In Stock** ({stock_num} available)"
-                elif stock_num > 10:
-                    return f"🟡 **Limited Stock** ({stock_num} available)"
-                elif stock_num > 0:
-                    return f"🟠 **Low Stock** ({stock_num} available)"
-                else:
-                    return "🔴 **Out of Stock**"
-            
-            # Get retailer icon
-            def get_retailer_icon(retailer_name):
-                retailer_lower = retailer_name.lower()
-                for keyword, icon in retailer_icons.items():
-                    if keyword in retailer_lower:
-                        return icon
-                return '🏪'  # Default store icon
-            
-            formatted_retailers = []
-            for retailer_name, product_name, stock in retailers:
-                icon = get_retailer_icon(retailer_name)
-                stock_status = get_stock_status(stock)
-                
-                retailer_card = f"""{icon} **{retailer_name}**
-🛍️ Product: {product_name}
-📊 {stock_status}
-📍 *Contact store for pricing and availability*
-
-"""
-                formatted_retailers.append(retailer_card)
+            cards = [
+                _RETAILER_CARD_TEMPLATE.format(
+                    icon=get_retailer_icon(retailer_name),
+                    retailer_name=retailer_name,
+                    product_name=product_name,
+                    stock_status=get_stock_status(stock)
+                )
+                for retailer_name, product_name, stock in retailers
+            ]
             
             # Create header
             count = len(retailers)
             product_name = retailers[0][1] if retailers else "products"
             header = f"🏬 **Retailers selling {product_name} ({count}):**\n\n"
             
-            # Combine all
-            result = header + "".join(formatted_retailers)
-            
             # Add footer with tips
             footer = """💡 **Shopping Tips:**
 • Check stock availability before visiting
@@ -465,38 +696,61 @@ class RAGChatbot:
 • Ask about warranty and return policies
 • Consider online vs in-store pickup options"""
             
-            return result + footer
+            return "".join((header, *cards, footer))
             
         except Exception as e:
             LOGGER.warning(f"[Format] Failed to format retailer results: {e}")
-            return f"Here are the retailers:\n\n{', '.join([r[0] for r in retailers])}"
+            return f"Here are the retailers:\n\n{', '.join(r[0] for r in retailers)}"
 
-    def _route_question(self, question: str) -> str:
-        """Route question to appropriate chain"""
-        LOGGER.debug(f"[Router] Analyzing question: {question}")
+    async def _ainvoke(self, chain, inputs: Dict[str, Any]) -> str:
+        """Invoke an LLM-backed chain asynchronously, capped at LLM_MAX_CONCURRENCY in flight"""
+        async with self._llm_semaphore:
+            return await chain.ainvoke(inputs)
+    
+    async def _run_sql(self, sql_query: str) -> str:
+        """Run a query on a worker thread, capped at DB_MAX_CONCURRENCY in flight"""
+        async with self._db_semaphore:
+            return await asyncio.to_thread(self._sql_tool.run, sql_query)
+    
+    async def _retrieve(self, question: str, question_lower: Optional[str] = None,
+                        query_vector: Optional[np.ndarray] = None) -> List[Document]:
+        """Retriever results for a question, reusing those of an identical earlier question"""
+        # The MiniLM tokenizer is uncased, so case and surrounding whitespace never change the result
+        key = (question_lower if question_lower is not None else question.lower()).strip()
+        docs = self._retrieval_cache.get(key)
+        if docs is not None:
+            self._retrieval_cache.move_to_end(key)
+            return list(docs)
+        
+        # The embeddings are unit length, so the caller's normalised vector is the same query;
+        # otherwise embedding through the batcher lets concurrent questions share a forward pass
+        vector = query_vector if query_vector is not None else await self.embedding_batcher.aembed_query(question)
+        docs = tuple(await self.vector_store.asimilarity_search_by_vector(vector, k=RETRIEVER_K))
+        self._retrieval_cache[key] = docs
+        if len(self._retrieval_cache) > RETRIEVAL_CACHE_SIZE:
+            self._retrieval_cache.popitem(last=False)
+        return list(docs)
+    
+    async def _route_question(self, question: str, keyword_route: str) -> str:
+        """Route question to appropriate chain, using keyword_route when the LLM router is unavailable"""
+        LOGGER.debug("[Router] Analyzing question: %s", question)
         
         if not self.router_chain:
             # Fallback to simple keyword routing
             LOGGER.debug("[Router] Using keyword-based routing (no LLM router available)")
-            if any(keyword in question.lower() for keyword in 
-                   ["product", "price", "stock", "category", "laptop", "smartphone", "cost", "buy"]):
-                LOGGER.debug("[Router] Keyword match -> SQL")
-                return "SQL"
-            elif any(keyword in question.lower() for keyword in 
-                     ["recommend", "suggest", "best", "compare", "like", "similar"]):
-                LOGGER.debug("[Router] Keyword match -> VECTOR")
-                return "VECTOR"
-            else:
+            if keyword_route == "LLM":
                 LOGGER.debug("[Router] No keyword match -> LLM")
-                return "LLM"
+            else:
+                LOGGER.debug("[Router] Keyword match -> %s", keyword_route)
+            return keyword_route
         
         try:
             LOGGER.debug("[Router] Using LLM-based routing")
-            route = self.router_chain.invoke({"question": question}).strip().upper()
-            LOGGER.debug(f"[Router] LLM suggested route: {route}")
+            route = (await self._ainvoke(self.router_chain, {"question": question})).strip().upper()
+            LOGGER.debug("[Router] LLM suggested route: %s", route)
             
             if route in ["SQL", "VECTOR", "LLM"]:
-                LOGGER.info(f"[Router] Final route decision: {route}")
+                LOGGER.info("[Router] Final route decision: %s", route)
                 return route
             
             LOGGER.warning(f"[Router] Invalid route '{route}' from LLM, defaulting to LLM")
@@ -504,26 +758,16 @@ class RAGChatbot:
         except Exception as e:
             LOGGER.warning(f"[Router] LLM routing failed: {e}, falling back to keyword routing")
             # Fallback to keyword routing
-            if any(keyword in question.lower() for keyword in 
-                   ["product", "price", "stock", "category", "laptop", "smartphone", "cost", "buy"]):
-                return "SQL"
-            elif any(keyword in question.lower() for keyword in 
-                     ["recommend", "suggest", "best", "compare", "like", "similar"]):
-                return "VECTOR"
-            else:
-                return "LLM"
+            return keyword_route
             
     def _handle_rate_limit_error(self, error_msg: str) -> Dict[str, Any]:
         """Handle rate limit errors with helpful messages"""
-        if "429" in str(error_msg) or "Too Many Requests" in str(error_msg):
+        if _is_rate_limited(error_msg):
             LOGGER.warning(f"[Rate Limit] NVIDIA API rate limit exceeded: {error_msg}")
-            return {
-                "response": "I'm happy you're chatting with me! However, the NVIDIA API rate limit has been exceeded. Please try again in a few seconds. 😊\n\nAlternatively, you can ask:\n• 'What products do you have?' (answered from database)\n• General questions about products and categories",
-                "source": "rate_limit"
-            }
+            return {"response": _RATE_LIMIT_RESPONSE, "source": "rate_limit"}
         LOGGER.error(f"[Error Handler] Unhandled error: {error_msg}")
         return {
-            "response": f"Sorry, I encountered an error: {str(error_msg)}", 
+            "response": f"Sorry, I encountered an error: {error_msg}", 
             "source": "error"
         }
 
@@ -537,7 +781,7 @@ class RAGChatbot:
                     return func(*args, **kwargs)
             except Exception as e:
                 error_str = str(e)
-                if "429" in error_str or "Too Many Requests" in error_str:
+                if _is_rate_limited(error_str):
                     if attempt < max_retries:
                         wait_time = (2 ** attempt) + 1  # 1, 3, 5 seconds
                         LOGGER.warning(f"Rate limit hit, waiting {wait_time} seconds before retry {attempt + 1}/{max_retries}...")
@@ -545,64 +789,114 @@ class RAGChatbot:
                         continue
                 raise e
 
-    def chat(self, message: str) -> Dict[str, Any]:
+    async def embed_message(self, message: str) -> Optional[np.ndarray]:
+        """Normalised embedding of a message, for callers to share across caches and retrieval; None if unavailable"""
+        if self.embedding_batcher is None:
+            return None
+        try:
+            return SemanticCache.normalize(await self.embedding_batcher.aembed_query(message))
+        except Exception as e:
+            LOGGER.warning(f"[Embeddings] Embedding failed: {e}")
+            return None
+    
+    async def chat(self, message: str, query_vector: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """Answer a message, reusing the response to a semantically identical earlier question"""
+        if self.semantic_cache is None:
+            return await self._answer(message, query_vector)
+        
+        if query_vector is None:
+            try:
+                query_vector = await self.semantic_cache.aembed(message)
+            except Exception as e:
+                LOGGER.warning(f"[Semantic Cache] Embedding failed, answering uncached: {e}")
+                return await self._answer(message)
+        
+        cached_result = self.semantic_cache.get(query_vector, CHAT_SEMANTIC_CACHE_GUARD)
+        if cached_result is not None:
+            LOGGER.info("[Semantic Cache] Hit for chat message")
+            return cached_result
+        
+        result = await self._answer(message, query_vector)
+        # Errors and rate limit notices are transient, never cache them
+        if result["source"] not in ("error", "rate_limit"):
+            self.semantic_cache.put(query_vector, CHAT_SEMANTIC_CACHE_GUARD, result, question=message)
+        return result
+    
+    async def chat_stream(self, message: str, query_vector: Optional[np.ndarray] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Answer a message as events: answer text as it is generated, then the full result"""
+        sink: asyncio.Queue = asyncio.Queue()
+        task = asyncio.create_task(self._chat_into(message, sink, query_vector))
+        try:
+            streamed = False
+            while (delta := await sink.get()) is not None:
+                streamed = True
+                yield {"delta": delta}
+            result = await task
+        finally:
+            # The client may disconnect mid-answer
+            task.cancel()
+        
+        # Direct, cached and canned answers are never generated token by token
+        if not streamed:
+            yield {"delta": result["response"]}
+        yield {"done": True, **result}
+    
+    async def _chat_into(self, message: str, sink: asyncio.Queue, query_vector: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """Run chat with streamable LLM steps sending their tokens to sink, closing it with None"""
+        # The task has its own context, so the sink only reaches this request's chains
+        TOKEN_SINK.set(sink)
+        try:
+            return await self.chat(message, query_vector)
+        finally:
+            sink.put_nowait(None)
+    
+    async def _answer(self, message: str, query_vector: Optional[np.ndarray] = None) -> Dict[str, Any]:
         """Main chat function using LangChain with rate limit handling"""
+        # Lowercase once; a single keyword pass gives both the fallback route and the SQL intent
+        message_lower = message.lower()
+        keyword_route, sql_intent = _match_keywords(message_lower)
+        
+        # While the LLM router decides, start the retriever lookup so a VECTOR route finds it done
+        retriever_task = None
+        if self.router_chain and self.retriever:
+            retriever_task = asyncio.create_task(self._retrieve(message, message_lower, query_vector))
+        
         try:
             # Route the question
-            route = self._route_question(message)
-            LOGGER.debug(f"Routing to: {route}")
+            route = await self._route_question(message, keyword_route)
+            LOGGER.debug("Routing to: %s", route)
             
             # For SQL and Vector routes, try without LLM first (no rate limits)
             if route == "SQL" and self.sql_chain:
                 try:
-                    # Try to get SQL results without LLM processing first
-                    from langchain_community.tools import QuerySQLDatabaseTool
-                    sql_tool = QuerySQLDatabaseTool(db=self.db)
+                    # Fixed-intent queries are answered from the precomputed responses
+                    cached_response = self._canned_responses.get(sql_intent)
+                    if cached_response is not None:
+                        LOGGER.info("[SQL Cache] Serving precomputed response for '%s'", sql_intent)
+                        return {"response": cached_response, "source": "sql_cache"}
                     
-                    # Simple product queries that can be answered directly from SQL
-                    if any(word in message.lower() for word in ["products", "laptop", "smartphone", "price", "categories", "retailers", "electronics", "books"]):
-                        sql_query = None
-                        if "laptop" in message.lower():
-                            sql_query = "SELECT p.name, c.name as category, MIN(r.price) as min_price, MAX(r.price) as max_price FROM products p JOIN categories c ON p.category_id = c.id JOIN retailers r ON p.id = r.product_id WHERE p.name LIKE '%Laptop%' GROUP BY p.id LIMIT 5;"
-                        elif "smartphone" in message.lower():
-                            sql_query = "SELECT p.name, c.name as category, MIN(r.price) as min_price, MAX(r.price) as max_price FROM products p JOIN categories c ON p.category_id = c.id JOIN retailers r ON p.id = r.product_id WHERE p.name LIKE '%Smartphone%' GROUP BY p.id LIMIT 5;"
-                        elif "electronics" in message.lower():
-                            sql_query = "SELECT p.name, c.name as category, MIN(r.price) as min_price, MAX(r.price) as max_price FROM products p JOIN categories c ON p.category_id = c.id JOIN retailers r ON p.id = r.product_id WHERE c.name = 'Electronics' GROUP BY p.id LIMIT 5;"
-                        elif "books" in message.lower():
-                            sql_query = "SELECT p.name, c.name as category, MIN(r.price) as min_price, MAX(r.price) as max_price FROM products p JOIN categories c ON p.category_id = c.id JOIN retailers r ON p.id = r.product_id WHERE c.name = 'Books' GROUP BY p.id LIMIT 5;"
-                        elif "categories" in message.lower():
-                            sql_query = "SELECT name FROM categories;"
-                        elif "retailers" in message.lower():
-                            sql_query = "SELECT r.name, p.name as product, r.price, r.stock FROM retailers r JOIN products p ON r.product_id = p.id LIMIT 5;"
-                        elif "what products" in message.lower() or "products available" in message.lower():
-                            sql_query = "SELECT p.name, c.name as category FROM products p JOIN categories c ON p.category_id = c.id ORDER BY c.name, p.name;"
-                        elif "products" in message.lower():
-                            sql_query = "SELECT p.name, c.name as category, MIN(r.price) as min_price, MAX(r.price) as max_price FROM products p JOIN categories c ON p.category_id = c.id JOIN retailers r ON p.id = r.product_id GROUP BY p.id LIMIT 10;"
+                    # Simple product queries that can be answered directly from SQL, without the LLM
+                    sql_query = _CANNED_SQL.get(sql_intent)
+                    if sql_query:
+                        LOGGER.info("[SQL Direct] Executing query: %s", sql_query)
+                        result = await self._run_sql(sql_query)
+                        LOGGER.info("[SQL Direct] Query result: %.200s%s", result, "..." if len(result) > 200 else "")
                         
-                        if sql_query:
-                            LOGGER.info(f"[SQL Direct] Executing query: {sql_query}")
-                            result = sql_tool.run(sql_query)
-                            LOGGER.info(f"[SQL Direct] Query result: {result[:200]}..." if len(str(result)) > 200 else f"[SQL Direct] Query result: {result}")
-                            
-                            if result:
-                                # Parse and format the SQL result for better presentation
-                                formatted_response = self._format_product_results(result)
-                                LOGGER.info(f"[SQL Direct] Formatted response length: {len(formatted_response)} chars")
-                                return {"response": formatted_response, "source": "sql_direct"}
-                        else:
-                            # Use the full SQL chain with retry
-                            LOGGER.info(f"[SQL Chain] Processing complex query: {message}")
-                            response = self.sql_chain.invoke({"question": message})
-                            LOGGER.info(f"[SQL Chain] Response: {response[:200]}..." if len(str(response)) > 200 else f"[SQL Chain] Response: {response}")
-                            return {"response": response, "source": "sql"}
+                        if result:
+                            # Parse and format the SQL result for better presentation
+                            formatted_response = self._format_product_results(result)
+                            LOGGER.info("[SQL Direct] Formatted response length: %d chars", len(formatted_response))
+                            return {"response": formatted_response, "source": "sql_direct"}
                     
-                    # For complex queries, use full chain with retry
-                    response = self.sql_chain.invoke({"question": message})
+                    # For complex queries, use the full SQL chain
+                    LOGGER.info("[SQL Chain] Processing complex query: %s", message)
+                    response = await self._ainvoke(self.sql_chain, {"question": message})
+                    LOGGER.info("[SQL Chain] Response: %.200s%s", response, "..." if len(response) > 200 else "")
                     return {"response": response, "source": "sql"}
                     
                 except Exception as e:
                     error_str = str(e)
-                    if "429" in error_str or "Too Many Requests" in error_str:
+                    if _is_rate_limited(error_str):
                         return self._handle_rate_limit_error(error_str)
                     LOGGER.warning(f"SQL chain failed: {e}")
                     # Fallback to vector search
@@ -611,29 +905,33 @@ class RAGChatbot:
             if route == "VECTOR" and self.vector_chain:
                 try:
                     # For vector search, get docs first and create simple response
-                    LOGGER.info(f"[Vector] Retrieving documents for query: {message}")
-                    docs = self.retriever.invoke(message)
-                    LOGGER.info(f"[Vector] Retrieved {len(docs)} documents")
+                    LOGGER.info("[Vector] Retrieving documents for query: %s", message)
+                    if retriever_task is not None:
+                        docs = await retriever_task
+                        retriever_task = None
+                    else:
+                        docs = await self._retrieve(message, message_lower, query_vector)
+                    LOGGER.info("[Vector] Retrieved %d documents", len(docs))
                     
                     if docs:
                         # Log document details
-                        for i, doc in enumerate(docs[:3]):  # Log first 3 docs
-                            LOGGER.debug(f"[Vector] Doc {i+1}: {doc.page_content[:100]}...")
+                        for i, doc in enumerate(islice(docs, 3)):  # Log first 3 docs
+                            LOGGER.debug("[Vector] Doc %d: %.100s...", i + 1, doc.page_content)
                         
-                        context = "\n".join([doc.page_content for doc in docs[:2]])  # Limit context
+                        context = "\n".join(doc.page_content for doc in islice(docs, 2))  # Limit context
                         simple_response = f"Based on your question, here's the relevant information:\n\n{context}\n\nWould you like to know about any specific product?"
-                        LOGGER.info(f"[Vector Direct] Generated response length: {len(simple_response)} chars")
+                        LOGGER.info("[Vector Direct] Generated response length: %d chars", len(simple_response))
                         return {"response": simple_response, "source": "vector_direct"}
                     
                     # If no docs found, try with LLM
-                    LOGGER.info(f"[Vector Chain] No relevant docs found, using LLM chain for: {message}")
-                    response = self.vector_chain.invoke({"question": message})
-                    LOGGER.info(f"[Vector Chain] LLM response: {response[:200]}..." if len(str(response)) > 200 else f"[Vector Chain] LLM response: {response}")
+                    LOGGER.info("[Vector Chain] No relevant docs found, using LLM chain for: %s", message)
+                    response = await self._ainvoke(self.vector_chain, {"question": message})
+                    LOGGER.info("[Vector Chain] LLM response: %.200s%s", response, "..." if len(response) > 200 else "")
                     return {"response": response, "source": "vector"}
                     
                 except Exception as e:
                     error_str = str(e)
-                    if "429" in error_str or "Too Many Requests" in error_str:
+                    if _is_rate_limited(error_str):
                         return self._handle_rate_limit_error(error_str)
                     LOGGER.warning(f"Vector chain failed: {e}")
                     # Fallback to simple response
@@ -641,21 +939,21 @@ class RAGChatbot:
             
             # Simple responses for common queries (no LLM needed)
             if route == "LLM" or route == "SIMPLE":
-                LOGGER.info(f"[LLM/Simple] Processing general query: {message}")
+                LOGGER.info("[LLM/Simple] Processing general query: %s", message)
                 
-                simple_responses = {
-                    "hi": "Hello! I'm your shopping assistant and I can help you with product searches. You can ask me:\n• 'What products are available?'\n• 'Show me laptops'\n• 'Smartphone prices'",
-                    "hello": "Hello! I'm your shopping assistant. How can I help you today?",
-                    "help": "I can help you with:\n• Product search\n• Price information\n• Category-wise products\n• Retailer information\n• Product recommendations",
-                    "thanks": "You're welcome! 😊 Is there anything else you'd like to know?",
-                    "thank you": "I'm happy to help! 😊 Feel free to ask more questions."
-                }
+                # Greetings are usually sent verbatim, so an exact lookup answers most of them
+                message_key = message_lower.strip()
+                response = _SIMPLE_RESPONSES.get(message_key)
+                if response is not None:
+                    LOGGER.info("[Simple Response] Matched keyword '%s' -> returning pre-defined response", message_key)
+                    return {"response": response, "source": "simple"}
                 
-                message_lower = message.lower().strip()
-                for key, response in simple_responses.items():
-                    if key in message_lower:
-                        LOGGER.info(f"[Simple Response] Matched keyword '{key}' -> returning pre-defined response")
-                        return {"response": response, "source": "simple"}
+                # One pass finds every keyword in the message; the earliest in the table wins
+                matches = [value for _, value in _SIMPLE_RESPONSE_AUTOMATON.iter(message_lower)]
+                if matches:
+                    _, key, response = min(matches)
+                    LOGGER.info("[Simple Response] Matched keyword '%s' -> returning pre-defined response", key)
+                    return {"response": response, "source": "simple"}
                 
                 # Generic fallback without LLM
                 LOGGER.info("[Fallback] No specific handler found, returning generic help message")
@@ -666,99 +964,237 @@ class RAGChatbot:
             
         except Exception as e:
             error_str = str(e)
-            if "429" in error_str or "Too Many Requests" in error_str:
+            if _is_rate_limited(error_str):
                 return self._handle_rate_limit_error(error_str)
             LOGGER.error(f"Chat error: {e}")
             return {
-                "response": f"Sorry, I encountered an error: {str(e)}", 
+                "response": f"Sorry, I encountered an error: {error_str}", 
                 "source": "error"
             }
+        finally:
+            # The speculative lookup is not needed when the route was not VECTOR
+            if retriever_task is not None:
+                retriever_task.cancel()
+
+class AgentRouter:
+    """The AI agents behind exact and semantic caches of their confident answers"""
+    
+    def __init__(self, agent_manager: AgentManager, embeddings: Optional[Embeddings] = None):
+        self.agent_manager = agent_manager
+        self.exact_cache: "LRUCache[bytes, Dict[str, Any]]" = LRUCache(maxsize=AGENT_EXACT_CACHE_SIZE)
+        self.semantic_cache = SemanticCache(
+            embeddings, path=AGENT_SEMANTIC_CACHE_PATH, threshold=AGENT_SEMANTIC_CACHE_THRESHOLD,
+            maxsize=AGENT_SEMANTIC_CACHE_SIZE
+        ) if embeddings is not None else None
+    
+    def lookup_exact(self, message: str) -> Optional[Dict[str, Any]]:
+        """The cached answer to an identical earlier message, checked before paying for an embedding"""
+        cached_result = self.exact_cache.get(hashlib.blake2b(message.encode()).digest())
+        if cached_result is None:
+            return None
+        LOGGER.info("[Agent Cache] Exact hit")
+        return dict(cached_result)
+    
+    async def route(self, message: str, query_vector: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """Route a message to the agents, reusing the answer to an identical or paraphrased earlier message"""
+        cached_result = self.lookup_exact(message)
+        if cached_result is not None:
+            return cached_result
+        
+        key = hashlib.blake2b(message.encode()).digest()
+        # The semantic cache is guarded by the agent and query branch the message routes to,
+        # so a close paraphrase that would be answered differently never shares an answer
+        query = Query.of(message)
+        intent = self.agent_manager.route_intent(query)
+        if self.semantic_cache is not None and intent is not None:
+            if query_vector is None:
+                try:
+                    query_vector = await self.semantic_cache.aembed(message)
+                except Exception as e:
+                    LOGGER.warning("[Agent Cache] Embedding failed, routing uncached: %s", e)
+            if query_vector is not None:
+                cached_result = self.semantic_cache.get(query_vector, intent)
+                if cached_result is not None:
+                    LOGGER.info("[Agent Cache] Semantic hit")
+                    self.exact_cache[key] = cached_result
+                    return dict(cached_result)
+        
+        # Agents call the LLM, embeddings and SQLite synchronously, so they run on a worker thread
+        agent_result = await asyncio.to_thread(self.agent_manager.route_query, query, {"query_vector": query_vector})
+        # Only confident, successful answers are cached; the rest fall back to the chatbot
+        if agent_result.get("routing_confidence") == "high" and agent_result.get("status") != AgentStatus.ERROR:
+            self.exact_cache[key] = dict(agent_result)
+            if query_vector is not None and self.semantic_cache is not None and intent is not None:
+                self.semantic_cache.put(query_vector, intent, agent_result, question=message)
+        return agent_result
+    
+    def clear(self) -> None:
+        """Drop the cached answers, e.g. after products.db changes"""
+        self.exact_cache.clear()
+        if self.semantic_cache is not None:
+            self.semantic_cache.clear()
 
-# Initialize the chatbot and agent manager
-chatbot = RAGChatbot()
+# One chatbot and one set of agents per process, built by lifespan at startup rather than on import
+@lru_cache(maxsize=None)
+def get_chatbot() -> RAGChatbot:
+    """The process-wide chatbot"""
+    return RAGChatbot()
 
-# Initialize AI Agents
-from agents.agent_manager import AgentManager
-agent_manager = AgentManager()
+@lru_cache(maxsize=None)
+def get_agent_router() -> AgentRouter:
+    """The process-wide agents, sharing the chatbot's batched embedding model for their semantic caches"""
+    embeddings = get_chatbot().embedding_batcher
+    return AgentRouter(AgentManager(embeddings=embeddings), embeddings)
 
-@app.post("/api/chat", response_model=ChatResponse)
+@app.post("/api/chat", responses={200: {"model": ChatResponse}})
 async def chat(request: ChatRequest):
-    import time
-    start_time = time.time()
+    start_time = time.perf_counter()
     
-    LOGGER.info(f"[API] Received chat request: '{request.message}' (length: {len(request.message)} chars)")
+    LOGGER.info("[API] Received chat request: '%s' (length: %d chars)", request.message, len(request.message))
     
-    try:
-        # Try AI agents first
-        agent_result = agent_manager.route_query(request.message)
-        
-        if agent_result.get("routing_confidence") == "high":
-            # Agent handled the query successfully
-            processing_time = time.time() - start_time
-            response_length = len(agent_result["response"])
-            
-            LOGGER.info(f"[API] Agent response - Agent: {agent_result.get('agent', 'Unknown')}, Source: {agent_result['source']}, Length: {response_length} chars, Time: {processing_time:.2f}s")
-            
-            return ChatResponse(
-                response=agent_result["response"],
-                source=f"{agent_result['source']} (via {agent_result.get('agent', 'AI Agent')})"
-            )
-        else:
-            # Fallback to original chatbot
-            LOGGER.info("[API] Falling back to original RAG chatbot")
-            result = chatbot.chat(request.message)
-            
-            processing_time = time.time() - start_time
-            response_length = len(result["response"])
-            
-            LOGGER.info(f"[API] Chatbot response - Source: {result['source']}, Length: {response_length} chars, Time: {processing_time:.2f}s")
-            
-            return ChatResponse(
-                response=result["response"],
-                source=result["source"]
-            )
-    except Exception as e:
-        processing_time = time.time() - start_time
-        LOGGER.error(f"[API] Chat endpoint failed after {processing_time:.2f}s: {e}")
+    # Bare greetings need neither the agents nor the chatbot's LLM router
+    simple_response = _simple_message_response(request.message)
+    if simple_response is not None:
+        LOGGER.info("[API] Simple message, skipping routing")
+        return AppJSONResponse({"response": simple_response, "source": "simple"})
+    
+    # Try AI agents first; a repeated message is answered without waiting for an embedding
+    chatbot = get_chatbot()
+    agent_router = get_agent_router()
+    query_vector = None
+    agent_result = agent_router.lookup_exact(request.message)
+    if agent_result is None:
+        # One embedding serves the agent and chat caches, the retailers agent and retrieval
+        query_vector = await chatbot.embed_message(request.message)
+        agent_result = await agent_router.route(request.message, query_vector)
+    
+    if agent_result.get("routing_confidence") == "high":
+        # Agent handled the query successfully
+        processing_time = time.perf_counter() - start_time
+        response = agent_result["response"]
+        source = agent_result["source"]
+        agent = agent_result.get("agent")
         
-        return ChatResponse(
-            response=f"Sorry, I encountered an error: {str(e)}",
-            source="api_error"
-        )
+        LOGGER.info("[API] Agent response - Agent: %s, Source: %s, Length: %d chars, Time: %.2fs",
+                    agent or "Unknown", source, len(response), processing_time)
+        
+        return AppJSONResponse({
+            "response": response,
+            "source": f"{source} (via {agent or 'AI Agent'})"
+        })
+    else:
+        # Fallback to original chatbot
+        LOGGER.info("[API] Falling back to original RAG chatbot")
+        result = await chatbot.chat(request.message, query_vector)
+        
+        processing_time = time.perf_counter() - start_time
+        response = result["response"]
+        source = result["source"]
+        
+        LOGGER.info("[API] Chatbot response - Source: %s, Length: %d chars, Time: %.2fs",
+                    source, len(response), processing_time)
+        
+        return AppJSONResponse({
+            "response": response,
+            "source": source
+        })
+
+def _sse(event: Dict[str, Any]) -> bytes:
+    """Encode one Server-Sent Events message"""
+    return b"data: " + orjson.dumps(event) + b"\n\n"
+
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Like /api/chat, but streamed as SSE: "delta" events with answer text, then a "done" event with the final response and source"""
+    LOGGER.info("[API] Received streaming chat request: '%s' (length: %d chars)", request.message, len(request.message))
+    
+    async def events() -> AsyncIterator[bytes]:
+        try:
+            simple_response = _simple_message_response(request.message)
+            if simple_response is not None:
+                yield _sse({"delta": simple_response})
+                yield _sse({"done": True, "response": simple_response, "source": "simple"})
+                return
+            
+            chatbot = get_chatbot()
+            agent_router = get_agent_router()
+            query_vector = None
+            agent_result = agent_router.lookup_exact(request.message)
+            if agent_result is None:
+                query_vector = await chatbot.embed_message(request.message)
+                agent_result = await agent_router.route(request.message, query_vector)
+            if agent_result.get("routing_confidence") == "high":
+                # Agent answers are formatted as a whole, so they arrive in one event
+                response = agent_result["response"]
+                source = f"{agent_result['source']} (via {agent_result.get('agent', 'AI Agent')})"
+                yield _sse({"delta": response})
+                yield _sse({"done": True, "response": response, "source": source})
+                return
+            
+            LOGGER.info("[API] Falling back to original RAG chatbot (streaming)")
+            async for event in chatbot.chat_stream(request.message, query_vector):
+                yield _sse(event)
+        except Exception as e:
+            LOGGER.error(f"[API] Streaming chat failed: {e}")
+            response = f"Sorry, I encountered an error: {str(e)}"
+            yield _sse({"delta": response})
+            yield _sse({"done": True, "response": response, "source": "api_error"})
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+# The root payload never changes, so it is encoded once; liveness probes often poll it
+_ROOT_BODY = orjson.dumps({
+    "message": "RAG Chatbot API is running!",
+    "features": ["SQL Database", "Vector Search", "LangChain Integration"],
+    "endpoints": ["/api/chat", "/health"]
+})
+
+@lru_cache(maxsize=None)
+def _agents_info_body() -> bytes:
+    """Encoded /agents payload; agent metadata is fixed once the agents are registered"""
+    return AppJSONResponse(get_agent_router().agent_manager.get_all_agents_info()).body
 
 @app.get("/")
 def read_root():
-    return {
-        "message": "RAG Chatbot API is running!",
-        "features": ["SQL Database", "Vector Search", "LangChain Integration"],
-        "endpoints": ["/api/chat", "/health"]
-    }
+    return Response(_ROOT_BODY, media_type="application/json")
+
+# Dict endpoints return AppJSONResponse directly, so FastAPI skips jsonable_encoder
 
 @app.get("/health")
 def health_check():
     # Get agent health status
-    agent_health = agent_manager.health_check()
+    agent_health = get_agent_router().agent_manager.health_check()
     
-    return {
+    return AppJSONResponse({
         "status": "healthy",
-        "components": {
-            "llm": chatbot.llm is not None,
-            "vector_store": chatbot.vector_store is not None,
-            "sql_database": chatbot.db is not None,
-            "sql_chain": chatbot.sql_chain is not None,
-            "vector_chain": chatbot.vector_chain is not None,
-            "router": chatbot.router_chain is not None
-        },
+        "components": get_chatbot().components,
         "agents": agent_health
-    }
+    })
 
 @app.get("/agents")
 def get_agents_info():
     """Get information about all available AI agents"""
-    return agent_manager.get_all_agents_info()
+    return Response(_agents_info_body(), media_type="application/json")
 
 @app.get("/agents/health")
 def get_agents_health():
     """Get detailed health check for all agents"""
-    return agent_manager.health_check()
+    return AppJSONResponse(get_agent_router().agent_manager.health_check())
 
+
+@app.post("/admin/refresh-cache")
+async def refresh_cache(x_admin_token: Optional[str] = Header(default=None)):
+    """Reload the product data and drop every cached answer after products.db changes; requires X-Admin-Token"""
+    # Disabled unless ADMIN_TOKEN is set, as anyone could otherwise force a full cache wipe
+    if not ADMIN_TOKEN or x_admin_token is None or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        return AppJSONResponse({"detail": "Forbidden"}, status_code=403)
+    
+    # Cached agent answers and the data behind them were built from the old database
+    agent_router = get_agent_router()
+    await asyncio.to_thread(agent_router.agent_manager.refresh_data)
+    # The exact cache is an unlocked LRUCache that chat requests use on the loop, so it is cleared here too
+    agent_router.clear()
+    chatbot = get_chatbot()
+    if chatbot.semantic_cache is not None:
+        chatbot.semantic_cache.clear()
+    return AppJSONResponse({"canned_responses": await asyncio.to_thread(chatbot.refresh_cache)})
@@ -0,0 +1,8 @@
+"""
+Shared test setup - the backend modules are imported from the backend directory, as the app runs them
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,53 @@
+"""
+AgentRouter semantic cache - paraphrases only share an answer when they route the same way
+"""
+
+import asyncio
+import importlib
+from typing import Any, Dict, List, Optional
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from agents.agent_manager import AgentManager
+
+class ConstantEmbeddings(Embeddings):
+    """Embeds every text to the same vector, so every pair of messages is a semantic match"""
+
+    def embed_query(self, text: str) -> List[float]:
+        return [1.0, 0.0, 0.0]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+class IntentEchoManager(AgentManager):
+    """Real keyword routing whose agents answer with the agent and branch they were routed to"""
+
+    def route_query(self, query: Any, context: Optional[Dict] = None) -> Dict[str, Any]:
+        self.routed.append(str(query))
+        return {"response": self.route_intent(query), "routing_confidence": "high", "status": "ok"}
+
+@pytest.fixture
+def router(tmp_path, monkeypatch):
+    """An AgentRouter over an IntentEchoManager, with its caches in a temporary directory"""
+    # main and the caches write their databases and session logs to the working directory
+    monkeypatch.chdir(tmp_path)
+    main = importlib.import_module("main")
+    agent_manager = IntentEchoManager.keyword_routing_only()
+    agent_manager.routed = []
+    return main.AgentRouter(agent_manager, ConstantEmbeddings())
+
+def test_similar_questions_for_different_agents_do_not_share_an_answer(router):
+    assert asyncio.run(router.route("show me phones")) == {
+        "response": "products:by_either_name", "routing_confidence": "high", "status": "ok"
+    }
+    assert asyncio.run(router.route("which retailers sell phones"))["response"] == "retailers:by_either_name"
+
+def test_similar_questions_for_different_branches_do_not_share_an_answer(router):
+    assert asyncio.run(router.route("which retailers sell the cheapest laptop"))["response"] == "retailers:by_name"
+    assert asyncio.run(router.route("which retailers sell the cheapest chair"))["response"] == "retailers:cheapest"
+
+def test_paraphrase_with_the_same_intent_reuses_the_answer(router):
+    first = asyncio.run(router.route("show me phones"))
+    assert asyncio.run(router.route("show me some phones")) == first
+    assert router.agent_manager.routed == ["show me phones"]
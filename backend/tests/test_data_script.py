@@ -0,0 +1,30 @@
+"""
+vector_store_is_current - the saved index is reused only when it is complete and built from the same data
+"""
+
+import pytest
+
+from data_script import CONTENT_HASH_FILE, INDEX_FILES, vector_store_is_current
+
+@pytest.fixture
+def index_dir(tmp_path):
+    """A saved index with every file present, built from data hashing to "abc" """
+    (tmp_path / CONTENT_HASH_FILE).write_text("abc")
+    for name in INDEX_FILES:
+        (tmp_path / name).write_bytes(b"")
+    return tmp_path
+
+def test_complete_index_with_the_same_hash_is_current(index_dir):
+    assert vector_store_is_current(str(index_dir), "abc")
+
+def test_different_hash_is_not_current(index_dir):
+    assert not vector_store_is_current(str(index_dir), "def")
+
+@pytest.mark.parametrize("missing", INDEX_FILES)
+def test_missing_index_file_is_not_current(index_dir, missing):
+    (index_dir / missing).unlink()
+    assert not vector_store_is_current(str(index_dir), "abc")
+
+def test_missing_hash_file_is_not_current(index_dir):
+    (index_dir / CONTENT_HASH_FILE).unlink()
+    assert not vector_store_is_current(str(index_dir), "abc")
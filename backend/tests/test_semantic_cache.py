@@ -0,0 +1,91 @@
+"""
+SemanticCache - ring-buffer eviction, warm start from the session log and TTL expiry
+"""
+
+import json
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+import cache
+from cache import SemanticCache
+
+DIMENSION = 128
+
+def unit(index: int) -> np.ndarray:
+    """A one-hot query vector, orthogonal to every other index"""
+    return np.eye(DIMENSION, dtype=np.float32)[index]
+
+def answer(index: int) -> dict:
+    return {"response": f"answer {index}"}
+
+def test_put_beyond_maxsize_evicts_the_oldest_entry():
+    semantic_cache = SemanticCache(None, maxsize=3)
+    for index in range(4):
+        semantic_cache.put(unit(index), "guard", answer(index))
+
+    assert semantic_cache.get(unit(0), "guard") is None
+    for index in range(1, 4):
+        assert semantic_cache.get(unit(index), "guard") == answer(index)
+
+def test_vector_matrix_grows_past_its_initial_capacity():
+    semantic_cache = SemanticCache(None, maxsize=100)
+    for index in range(70):
+        semantic_cache.put(unit(index), "guard", answer(index))
+
+    assert len(semantic_cache._vectors) == 100
+    assert all(semantic_cache.get(unit(index), "guard") == answer(index) for index in range(70))
+
+def test_guard_must_match():
+    semantic_cache = SemanticCache(None)
+    semantic_cache.put(unit(0), "by_name", answer(0))
+
+    assert semantic_cache.get(unit(0), "cheapest") is None
+
+def test_warm_start_overwrites_slot_zero_first(tmp_path):
+    path = str(tmp_path / "semantic_cache.jsonl")
+    first_run = SemanticCache(None, path=path, maxsize=2)
+    first_run.put(unit(0), "guard", answer(0))
+    first_run.put(unit(1), "guard", answer(1))
+
+    second_run = SemanticCache(None, path=path, maxsize=2)
+    assert second_run.get(unit(0), "guard") == answer(0)
+    second_run.put(unit(2), "guard", answer(2))
+
+    # The oldest logged entry was loaded into slot 0, so it is the one replaced
+    assert second_run.get(unit(0), "guard") is None
+    assert second_run.get(unit(1), "guard") == answer(1)
+    assert second_run.get(unit(2), "guard") == answer(2)
+
+def test_expired_entry_is_not_returned(monkeypatch):
+    semantic_cache = SemanticCache(None, ttl=60)
+    semantic_cache.put(unit(0), "guard", answer(0))
+
+    later = time.time() + 120
+    monkeypatch.setattr(cache, "time", SimpleNamespace(time=lambda: later))
+    assert semantic_cache.get(unit(0), "guard") is None
+
+def test_warm_start_drops_expired_entries_and_compacts_the_log(tmp_path):
+    path = tmp_path / "semantic_cache.jsonl"
+    now = time.time()
+    records = [
+        {"t": now - 7200, "g": "guard", "q": "old", "r": answer(0), "e": unit(0).tolist()},
+        {"t": now, "g": "guard", "q": "new", "r": answer(1), "e": unit(1).tolist()},
+    ]
+    path.write_text("".join(json.dumps(record) + "\n" for record in records), encoding="utf-8")
+
+    semantic_cache = SemanticCache(None, path=str(path), ttl=3600)
+
+    assert semantic_cache.get(unit(0), "guard") is None
+    assert semantic_cache.get(unit(1), "guard") == answer(1)
+    assert [json.loads(line)["q"] for line in path.read_text(encoding="utf-8").splitlines()] == ["new"]
+
+def test_clear_truncates_the_log(tmp_path):
+    path = tmp_path / "semantic_cache.jsonl"
+    semantic_cache = SemanticCache(None, path=str(path))
+    semantic_cache.put(unit(0), "guard", answer(0))
+    semantic_cache.clear()
+
+    assert semantic_cache.get(unit(0), "guard") is None
+    assert path.read_text(encoding="utf-8") == ""
@@ -0,0 +1,42 @@
+"""
+FAISS HNSW index over the product documents, shared by the build script and the chatbot
+"""
+
+from typing import List
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+VECTOR_INDEX_DIR = "./faiss_index"
+EMBEDDING_DIMENSION = 384  # all-MiniLM-L6-v2
+
+# HNSW graph degree and search breadth; higher means better recall and slower queries
+HNSW_M = 32
+HNSW_EF_SEARCH = 64
+
+def create_vector_store(documents: List[Document], embeddings: Embeddings, persist_directory: str = VECTOR_INDEX_DIR):
+    """Embed the documents into a new HNSW index and save it to persist_directory"""
+    # faiss is only needed once the index is built or loaded
+    import faiss
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+
+    # Embeddings are unit length, so L2 distance ranks exactly like cosine similarity
+    index = faiss.IndexHNSWFlat(EMBEDDING_DIMENSION, HNSW_M)
+    vector_store = FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=InMemoryDocstore(),
+        index_to_docstore_id={}
+    )
+    vector_store.add_documents(documents)
+    vector_store.save_local(persist_directory)
+    return vector_store
+
+def load_vector_store(embeddings: Embeddings, persist_directory: str = VECTOR_INDEX_DIR):
+    """Load the saved index for querying"""
+    from langchain_community.vectorstores import FAISS
+
+    # The docstore pickle is written by create_vector_store, never taken from users
+    vector_store = FAISS.load_local(persist_directory, embeddings, allow_dangerous_deserialization=True)
+    vector_store.index.hnsw.efSearch = HNSW_EF_SEARCH
+    return vector_store